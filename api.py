@@ -0,0 +1,110 @@
+"""
+HTTP API over the car search services (async, for multi-worker serving).
+
+Run with:
+    uvicorn api:app --workers 4 --loop uvloop --http httptools
+
+Each worker process builds one CarSearchService (browser, HTTP pools and
+caches) at startup and reuses it for every request.
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.DEBUG if os.getenv("AH_DEBUG") == "1" else logging.INFO,
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+)
+
+from services.car_search_system import CarSearchService
+from services.fuel_cost_service import FuelCostAnalysisService
+from services.offer_analysis_service import OfferAnalysisService
+from utils.tracing import init_tracing
+
+log = logging.getLogger(__name__)
+
+
+class SearchRequest(BaseModel):
+    query: str
+    context_text: str = ""
+
+
+class ChatRequest(BaseModel):
+    question: str
+    results: List[dict] = []
+    context_text: str = ""
+
+
+class OfferRequest(BaseModel):
+    description: str
+    price: float
+    mileage: float
+    year: int
+    recent_results: Optional[List[dict]] = None
+
+
+class FuelCostRequest(BaseModel):
+    km_per_month: float
+    avg_consumption: float
+    fuel_price: float
+    avg_person_weight: Optional[float] = None
+    num_people: Optional[int] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_tracing()
+    # Starting the scraper's browser blocks, so keep it off the event loop
+    car_service = await asyncio.to_thread(CarSearchService)
+    async with car_service:
+        app.state.car_service = car_service
+        app.state.offer_service = OfferAnalysisService()
+        app.state.fuel_service = FuelCostAnalysisService()
+        log.info("Services ready (pid %d)", os.getpid())
+        yield
+
+
+app = FastAPI(title="CarSearch AI", lifespan=lifespan)
+
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    """Parse, scrape, rank and summarise in one call."""
+    if not request.query.strip():
+        raise HTTPException(status_code=422, detail="Query must not be empty.")
+    return await app.state.car_service.handle_query(request.query, request.context_text)
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    """Answer a question about a result set, streamed as plain text."""
+    stream = app.state.car_service.stream_chat_async(request.question, request.results, request.context_text)
+    return StreamingResponse(stream, media_type="text/plain; charset=utf-8")
+
+
+@app.post("/analyze-offer")
+async def analyze_offer(request: OfferRequest):
+    """Price position, discount, scam risk and buyer message for one offer."""
+    # OfferAnalysisService is synchronous (pooled requests session), so it runs in a worker thread
+    return await asyncio.to_thread(
+        app.state.offer_service.analyze,
+        request.description, request.price, request.mileage, request.year, request.recent_results,
+    )
+
+
+@app.post("/fuel-cost")
+async def fuel_cost(request: FuelCostRequest):
+    """Monthly/yearly fuel cost; pure memoised arithmetic, so it runs inline."""
+    return app.state.fuel_service.analyze(
+        request.km_per_month, request.avg_consumption, request.fuel_price,
+        request.avg_person_weight, request.num_people,
+    )
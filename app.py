@@ -6,22 +6,42 @@ try:
 except RuntimeError:
     pass
 
+import logging
+import os
+
+# Configured before the service imports, which log while loading.
+# AH_DEBUG=1 enables the per-request debug messages.
+logging.basicConfig(
+    level=logging.DEBUG if os.getenv("AH_DEBUG") == "1" else logging.INFO,
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+)
+
 import streamlit as st
+import atexit
 import base64
-import os
+import html
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-import pypdf
 from services.car_search_system import CarSearchService
-from utils.tracing import init_tracing
+from utils.tracing import init_tracing, flush_tracing
 from services.fuel_cost_service import FuelCostAnalysisService
 from utils.prompts import PromptLoader
 from utils.ai import call_gemini
+from utils.pdf_extract import extract_with_pages
 from services.offer_analysis_service import OfferAnalysisService
 from components.negotiation_ui import render_negotiation_analysis
 
 # Load env vars and init tracing
 load_dotenv()
-init_tracing()
+
+
+@st.cache_resource
+def _init_tracing():
+    # Tracing is configured once per server process; it batches and flushes in the background
+    return init_tracing()
+
+
+_init_tracing()
 
 st.set_page_config(
     page_title="Auto Hunter",
@@ -31,11 +51,13 @@ st.set_page_config(
 
 
 # --- FUNCTION TO SET BACKGROUND IMAGE ---
-def set_background(image_file):
+@st.cache_data
+def _bg_css(image_file: str) -> str:
+    # Read and base64-encode the image once per process instead of on every rerun
     with open(image_file, "rb") as f:
         data = f.read()
     b64_encoded = base64.b64encode(data).decode()
-    style = f"""
+    return f"""
         <style>
         .stApp {{
             background-image: url(data:image/png;base64,{b64_encoded});
@@ -45,7 +67,16 @@ def set_background(image_file):
         }}
         </style>
     """
-    st.markdown(style, unsafe_allow_html=True)
+
+
+@st.cache_data
+def _read_image(image_file: str) -> bytes:
+    with open(image_file, "rb") as f:
+        return f.read()
+
+
+def set_background(image_file):
+    st.markdown(_bg_css(image_file), unsafe_allow_html=True)
 
     # --- CSS FOR "FLOATING CARD" UI ---
 st.markdown(
@@ -106,11 +137,57 @@ if "offer_service" not in st.session_state:
 header_path = os.path.join(current_folder, "black_header.png")
 
 try:
-    st.image(header_lumn=True)
+    st.image(_read_image(header_path), use_column_width=True)
 except Exception:
     # Fallback if image isn't found
     st.title("🚗 CarSearch AI")
 
+CAR_CARD_CSS = """
+<style>
+.car-card { display: flex; gap: 20px; padding: 16px; margin-bottom: 16px;
+            border: 1px solid rgba(255, 255, 255, 0.2); border-radius: 12px; }
+.car-card .car-img { flex: 1; }
+.car-card .car-img img { width: 100%; border-radius: 8px; }
+.car-card .car-body { flex: 3; }
+.car-card .car-ai { padding: 8px 12px; margin: 8px 0; border-radius: 8px;
+                    background-color: rgba(28, 131, 225, 0.2); }
+</style>
+"""
+
+
+def render_car_cards(results: list) -> str:
+    parts = [CAR_CARD_CSS]
+    for car in results:
+        image_url = car.get('image_url') or ""
+        if "http" in image_url:
+            image = f"<img src='{html.escape(image_url, quote=True)}'>"
+        else:
+            image = "<p><small>No Image Available</small></p>"
+
+        ai_block = ""
+        if car.get('ai_description'):
+            ai_block = f"<div class='car-ai'>🤖 <strong>AI says:</strong> {html.escape(car['ai_description'])}</div>"
+
+        link_block = ""
+        if car.get('link'):
+            link_block = f"<a href='{html.escape(car['link'], quote=True)}' target='_blank'>👉 View Full Listing</a>"
+
+        parts.append(
+            "<div class='car-card'>"
+            f"<div class='car-img'>{image}</div>"
+            "<div class='car-body'>"
+            f"<h3>{html.escape(car.get('title', 'No Title'))}</h3>"
+            f"{ai_block}"
+            f"<p><strong>Price:</strong> €{car.get('price', 0):,} | "
+            f"<strong>Year:</strong> {car.get('year', 'N/A')} | "
+            f"<strong>KM:</strong> {car.get('km', 0):,} km | "
+            f"<strong>Fuel:</strong> {html.escape(str(car.get('fuel', 'N/A')))}</p>"
+            f"{link_block}"
+            "</div></div>"
+        )
+    return "\n".join(parts)
+
+
 def fuel_cost_page():
     st.title("⛽ Fuel & Cost Analyzer")
     km_month = st.number_input("Monthly distance (km)", min_value=0.0)
@@ -136,6 +213,27 @@ def fuel_cost_page():
         explanation = call_gemini(prompt)
         st.subheader("AI Recommendations")
         st.write(explanation)
+        flush_tracing()
+
+@st.cache_resource
+def get_car_service():
+    # One service (and one Chrome driver) per server process, shared across reruns
+    service = CarSearchService()
+    atexit.register(service.close)
+    return service
+
+
+@st.cache_resource
+def _pdf_pool():
+    # Shared worker pool so PDF parsing runs outside the Streamlit script thread
+    return ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+
+
+@st.cache_data(show_spinner=False)
+def _extract_pdf_cached(file_bytes: bytes) -> tuple[str, int]:
+    # Keyed on the file bytes, so reruns and re-uploads of the same PDF skip extraction
+    future = _pdf_pool().submit(extract_with_pages, file_bytes)
+    return future.result()
 
 # --- SIDEBAR: PDF DOCUMENT INGESTION ---
 with st.sidebar:
@@ -145,12 +243,9 @@ with st.sidebar:
     if uploaded_file:
         try:
             with st.spinner("Processing PDF..."):
-                pdf_reader = pypdf.PdfReader(uploaded_file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+                text, num_pages = _extract_pdf_cached(uploaded_file.getvalue())
                 st.session_state.pdf_context = text
-                st.success(f"✅ Ingested {len(pdf_reader.pages)} pages!")
+                st.success(f"✅ Ingested {num_pages} pages!")
         except Exception as e:
             st.error(f"Error reading PDF: {e}")
 
@@ -186,7 +281,7 @@ with tab1:
                 # Lazy Initialization
                 if st.session_state.car_service is None:
                     try:
-                        st.session_state.car_service = CarSearchService()
+                        st.session_state.car_service = get_car_service()
                     except Exception as e:
                         st.error(f"Failed to initialize service: {e}")
                         st.stop()
@@ -198,27 +293,20 @@ with tab1:
                 raw_results = st.session_state.car_service.search_cars(filters)
 
                 if raw_results:
-                    # 3. AI Rank & Annotate
-                    with st.spinner("🤖 AI is analyzing and ranking deals..."):
-                        try:
-                            processed_results = st.session_state.car_service.rank_and_annotate(user_query, raw_results)
-                            st.session_state.current_results = processed_results
-                        except AttributeError:
-                            st.session_state.current_results = raw_results
-                    
-                    # 4. Generate Market Summary
-                    with st.spinner("Generating final market report..."):
-                        try:
-                            summary = st.session_state.car_service.summarize_results(
-                                st.session_state.current_results,
-                                context_text=st.session_state.pdf_context
-                            )
-                            st.session_state.search_summary = summary
-                        except AttributeError:
-                            st.session_state.search_summary = ""
+                    # 3 + 4. AI Rank & Annotate and Market Summary in one Gemini call
+                    with st.spinner("🤖 AI is ranking deals and generating the market report..."):
+                        ranked, summary = st.session_state.car_service.rank_summarize_combined(
+                            user_query,
+                            raw_results,
+                            context_text=st.session_state.pdf_context,
+                            filters=filters
+                        )
+                        st.session_state.current_results = ranked
+                        st.session_state.search_summary = summary
                 else:
                     st.session_state.current_results = []
                     st.warning("No cars found matching your query. Check the terminal for details.")
+                flush_tracing()
 
     # --- DISPLAY: RENDER DATA (Outside button block so it persists) ---
     if st.session_state.current_results:
@@ -228,30 +316,13 @@ with tab1:
         st.markdown("### 🎯 Best Matches (Ranked by AI)")
         st.success(f"Found {len(results)} listings based on your criteria.")
 
-        # Show Listings
-        for car in results:
-            with st.container(border=True):
-                col1, col2 = st.columns([1, 3])
-                with col1:
-                    if car.get('image_url') and "http" in car['image_url']:
-                        st.image(car['image_url'], use_column_width=True)
-                    else:
-                        st.caption("No Image Available")
-                with col2:
-                    st.subheader(car.get('title', 'No Title'))
-                    # AI Description
-                    if car.get('ai_description'):
-                        st.info(f"🤖 **AI says:** {car['ai_description']}")
-                    
-                    st.markdown(
-                        f"**Price:** €{car.get('price', 0):,} | "
-                        f"**Year:** {car.get('year', 'N/A')} | "
-                        f"**KM:** {car.get('km', 0):,} km | "
-                        f"**Fuel:** {car.get('fuel', 'N/A')}"
-                    )
-                    
-                    if car.get('link'):
-                        st.markdown(f"[👉 View Full Listing]({car['link']})")
+        # Show Listings (one markdown block instead of several widgets per car;
+        # the HTML is rebuilt only when a new result list comes in)
+        cached = st.session_state.get("results_html")
+        if not cached or cached[0] is not results:
+            cached = (results, render_car_cards(results))
+            st.session_state.results_html = cached
+        st.markdown(cached[1], unsafe_allow_html=True)
 
         # Market Summary at the bottom
         if st.session_state.search_summary:
@@ -279,13 +350,16 @@ with tab2:
         q = st.chat_input("Ask questions (e.g., 'Which represents the best value?')")
         if q:
             st.session_state.chat_history.append({'role': 'user', 'content': q})
-            with st.spinner("Analyzing..."):
-                ans = st.session_state.car_service.chat_about_results(
+            with st.chat_message('user'):
+                st.write(q)
+            with st.chat_message('assistant'):
+                ans = st.write_stream(st.session_state.car_service.stream_chat(
                     q,
                     st.session_state.current_results,
                     context_text=st.session_state.pdf_context
-                )
+                ))
             st.session_state.chat_history.append({'role': 'assistant', 'content': ans})
+            flush_tracing()
             st.rerun()
 
         if st.button("🗑️ Clear Chat"):
@@ -341,6 +415,7 @@ with tab4:
                 year=year,
                 recent_results=st.session_state.get("current_results", [])
             )
+        flush_tracing()
 
         st.subheader("📊 Negotiation Analysis")
         
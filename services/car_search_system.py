@@ -1,45 +1,320 @@
+import asyncio
+import functools
+import heapq
 import json
+import logging
 import os
+import re
 import backoff
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator, AsyncIterator
 
 # --- SAFE IMPORT FOR LANGFUSE ---
 try:
-    from langfuse.decorators import observe
+    from langfuse import observe  # langfuse >= 3
 except ImportError:
-    def observe(*args, **kwargs):
-        def decorator(func):
-            return func
-        return decorator
+    try:
+        from langfuse.decorators import observe  # langfuse 2.x
+    except ImportError:
+        def observe(*args, **kwargs):
+            def decorator(func):
+                return func
+            return decorator
 # --------------------------------
 
+# --- FAST JSON (orjson when installed) ---
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    _loads = json.loads
+# -----------------------------------------
+
+# --- OPTIONAL ASYNC HTTP (httpx, HTTP/2 when h2 is installed) ---
+try:
+    import httpx
+    _ASYNC_HTTP_ERRORS = (httpx.HTTPError, json.JSONDecodeError)
+except ImportError:
+    httpx = None
+    _ASYNC_HTTP_ERRORS = (json.JSONDecodeError,)
+# ------------------------------------------------------------------
+
 from tools.standvirtual_scraper import StandvirtualScraper
+from utils import llm_cache
+from utils.ai import MODEL_EXTRACT
+from utils.semantic_cache import SemanticCache
+
+log = logging.getLogger(__name__)
+
+# Upper bound (in characters) on uploaded-document text sent with each prompt
+_MAX_CTX = 6000
+
+# Rephrased queries ("bmw 320d under 10k" / "BMW 320d até 10k€") reuse earlier parses.
+# Queries are only compared within a namespace of their regex-parsed fuel,
+# location and numbers (CarSearchService._query_namespace), so "under 10k"
+# never answers for "under 20k", nor "golf diesel" for "golf gasolina".
+_query_cache = SemanticCache(threshold=0.95)
+
+
+@backoff.on_exception(
+    backoff.expo,
+    (requests.exceptions.RequestException, json.JSONDecodeError),
+    max_tries=5
+)
+def _gemini_post(session, url, body: bytes):
+    """
+    POSTs a pre-encoded structured-output request and returns the decoded JSON answer.
+    Defined once at module scope so the retry wrapper is not rebuilt per call.
+    """
+    response = session.post(url, data=body, timeout=30)
+
+    if response.status_code != 200:
+        log.error("Gemini error %s: %.200s", response.status_code, response.text)
+        response.raise_for_status()
+
+    result = _loads(response.content)
+    json_str = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '{}')
+    return _loads(json_str)
+
+
+_http_version_logged = False
+
+
+def _log_http_version(response) -> None:
+    # Reported once, to confirm whether requests are multiplexed over HTTP/2
+    global _http_version_logged
+    if not _http_version_logged:
+        _http_version_logged = True
+        log.info("Async Gemini client negotiated %s", response.http_version)
+
+
+@backoff.on_exception(backoff.expo, _ASYNC_HTTP_ERRORS, max_tries=5)
+async def _gemini_post_async(client, url, body: bytes):
+    """
+    Async twin of _gemini_post on an httpx.AsyncClient.
+    """
+    response = await client.post(url, content=body)
+    _log_http_version(response)
+    if response.status_code != 200:
+        log.error("Gemini error %s: %.200s", response.status_code, response.text)
+        response.raise_for_status()
+    result = _loads(response.content)
+
+    json_str = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '{}')
+    return _loads(json_str)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_prompt(filename: str) -> str:
+    """
+    Robustly resolves the path to the prompts folder and loads the file.
+    Cached per process, so re-creating the service does not hit the disk again.
+    """
+    try:
+        # 1. Resolve path relative to this file (services/car_search_system.py)
+        current_dir = Path(__file__).parent.resolve()
+        # Go up one level to project root, then into prompts
+        project_root = current_dir.parent
+        file_path = project_root / "prompts" / filename
+        
+        log.debug("Loading prompt from %s", file_path)
+
+        if not file_path.exists():
+            log.warning("Prompt file not found: %s", file_path)
+            return ""
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+            if content:
+                log.debug("Prompt loaded (%d chars)", len(content))
+                return content
+            else:
+                log.warning("Prompt file is empty: %s", filename)
+                return ""
+                
+    except Exception as e:
+        log.error("Error loading prompt: %s", e)
+        return ""
+
+
+_LLM_STR_LIMIT = 80
+
+
+def _compact_for_llm(car: dict) -> dict:
+    """
+    Project a scraped listing onto the few fields the LLM actually reads,
+    under short keys (t=title, p=price, y=year, k=km, f=fuel).
+    Strings are capped and missing fields dropped to keep the token count down.
+    """
+    compact = {}
+    for key, field in (("t", "title"), ("p", "price"), ("y", "year"), ("k", "km"), ("f", "fuel")):
+        value = car.get(field)
+        if value is None or value == "":
+            continue
+        if isinstance(value, str):
+            value = value[:_LLM_STR_LIMIT]
+        compact[key] = value
+    return compact
+
+
+def _dedupe_for_llm(cars: list) -> list:
+    """
+    Drop near-identical listings (same title, year and price within €500),
+    which are common when dealers re-post the same car.
+    """
+    seen = set()
+    unique = []
+    for car in cars:
+        key = ((car.get("title") or "").lower(), car.get("year"), (car.get("price") or 0) // 500)
+        if key not in seen:
+            seen.add(key)
+            unique.append(car)
+    return unique
+
+
+def _listings_for_llm(results: list, limit: int = 15) -> str:
+    return _dumps([_compact_for_llm(c) for c in _dedupe_for_llm(results)[:limit]]).decode()
+
+
+def _filter_distance(car: dict, filters: dict) -> float:
+    """
+    Cheap mismatch score of a listing against the parsed filters (lower is better).
+    Unknown values (0 / missing) count as a full miss on that field.
+    """
+    score = 0.0
+    price = car.get("price") or 0
+    min_price, max_price = filters.get("min_price"), filters.get("max_price")
+    if min_price or max_price:
+        # Relative distance outside the requested price range (0 inside it)
+        if not price:
+            score += 1.0
+        elif max_price and price > max_price:
+            score += (price - max_price) / max_price
+        elif min_price and price < min_price:
+            score += (min_price - price) / min_price
+
+    min_year = filters.get("min_year")
+    if min_year:
+        year = car.get("year") or 0
+        if not year:
+            score += 1.0
+        elif year < min_year:
+            score += 0.2 * (min_year - year)
+
+    max_km = filters.get("max_km")
+    if max_km:
+        km = car.get("km") or 0
+        score += (km - max_km) / max_km if km > max_km else 0.0
+
+    fuel = filters.get("fuel")
+    if fuel and (car.get("fuel") or "").lower() != fuel.lower():
+        score += 0.5
+    return score
+
+
+def _prefilter(results: list, filters: dict = None, k: int = 15) -> list:
+    """
+    Pick the k listings closest to the parsed filters, so only those reach the LLM.
+    Ties keep the site's order; without filters this is just results[:k].
+    """
+    if len(results) <= k:
+        return results
+    active = {key: value for key, value in (filters or {}).items() if value is not None}
+    if not active:
+        return results[:k]
+    return heapq.nsmallest(k, results, key=lambda car: _filter_distance(car, active))
+
 
 class CarSearchService:
     
     LLM_MODEL = "gemini-2.5-flash-preview-09-2025"
+    # Per-task routing: deterministic JSON extraction runs on the small model,
+    # ranking, summaries and chat stay on the main one
+    MODEL_EXTRACT = MODEL_EXTRACT
+    MODEL_CHAT = LLM_MODEL
     API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models/"
+    SMALL_RESULT_SET = 3
+
+    # --- LOCAL QUERY PARSER (skips the Gemini round-trip for common queries) ---
+    # "150 000" / "15.000" (grouped thousands), "12,5" / "12.5" (decimals), optional "k" / "mil"
+    _NUM = r"(?<![\d.,])(\d{1,3}(?:[ .,]\d{3}(?!\d))+|\d+(?:[.,]\d+)?)\s*(k|mil)?\b"
+    _EUR = r"\s*(€|eur(?:os?)?)?"
+    _RE_KM = re.compile(r"(?:(?:max|under|below|até|up to|less than)\s*)?" + _NUM + r"\s*km\b")
+    _RE_PRICE = re.compile(r"(?:between|entre|from|de)?\s*" + _NUM + _EUR + r"\s*(?:-|–|to|and|e|a)\s*" + _NUM + _EUR)
+    _RE_PRICE_MAX = re.compile(r"(?:under|below|max(?:imum)?|up to|até|less than|cheaper than)\s*" + _NUM + _EUR)
+    _RE_PRICE_MIN = re.compile(r"(?:above|over|more than|acima de|min(?:imum)?)\s*" + _NUM + _EUR)
+    _RE_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+    _RE_WORD = re.compile(r"[^\W_][\w-]*")
+    _RE_NUMBER = re.compile(r"\d+")
+    _RE_BARE_NUMBER = re.compile(_NUM)
+    MIN_PLAUSIBLE_PRICE = 500
+
+    _BRANDS = {
+        "abarth": "Abarth", "alfa romeo": "Alfa Romeo", "audi": "Audi", "bmw": "BMW", "citroen": "Citroen",
+        "citroën": "Citroen", "cupra": "Cupra", "dacia": "Dacia", "fiat": "Fiat", "ford": "Ford", "honda": "Honda",
+        "hyundai": "Hyundai", "jeep": "Jeep", "kia": "Kia", "land rover": "Land Rover", "lexus": "Lexus",
+        "mazda": "Mazda", "mercedes-benz": "Mercedes-Benz", "mercedes": "Mercedes-Benz", "mini": "MINI",
+        "mitsubishi": "Mitsubishi", "nissan": "Nissan", "opel": "Opel", "peugeot": "Peugeot", "porsche": "Porsche",
+        "renault": "Renault", "seat": "Seat", "skoda": "Skoda", "smart": "Smart", "tesla": "Tesla",
+        "toyota": "Toyota", "volkswagen": "VW", "vw": "VW", "volvo": "Volvo",
+    }
+    _FUELS = {
+        "diesel": "Diesel", "gasóleo": "Diesel", "gasolina": "Gasolina", "petrol": "Gasolina",
+        "gasoline": "Gasolina", "elétrico": "Elétrico", "eletrico": "Elétrico", "electric": "Elétrico",
+        "híbrido": "Híbrido", "hibrido": "Híbrido", "hybrid": "Híbrido",
+    }
+    _LOCATIONS = {
+        "lisboa": "Lisboa", "lisbon": "Lisboa", "porto": "Porto", "braga": "Braga", "coimbra": "Coimbra",
+        "faro": "Faro", "aveiro": "Aveiro", "setúbal": "Setúbal", "setubal": "Setúbal", "leiria": "Leiria",
+    }
+    _MODEL_PREFIXES = {"series", "serie", "série", "class", "classe", "model"}
+    _FILTER_FIELDS = ("brand", "model", "min_price", "max_price", "min_year", "max_km", "fuel", "location")
+    # Brand and model are left to the embedding; these must match exactly for a cache hit
+    _NAMESPACE_FIELDS = ("min_price", "max_price", "min_year", "max_km", "fuel", "location")
+    _NOT_MODEL = {
+        "car", "cars", "carro", "from", "de", "under", "below", "between", "entre", "above", "over", "max",
+        "with", "com", "in", "em", "and", "e", "until", "até", "up", "less", "more", "cheap", "barato", "since",
+    }
 
     def __init__(self):
-        print("[Service] Initializing Standvirtual Scraper...")
+        log.info("Initializing Standvirtual scraper")
         self.scraper = StandvirtualScraper()
         
         self.api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY", "")
-        self.api_url = f"{self.API_BASE_URL}{self.LLM_MODEL}:generateContent"
+        self.api_url = f"{self.API_BASE_URL}{self.MODEL_CHAT}:generateContent"
+        self.stream_url = f"{self.API_BASE_URL}{self.MODEL_CHAT}:streamGenerateContent"
+        self._sse_url = f"{self.stream_url}?alt=sse"
+        self._model_urls = {
+            model: f"{self.API_BASE_URL}{model}:generateContent"
+            for model in (self.MODEL_CHAT, self.MODEL_EXTRACT)
+        }
+
+        # Keep-alive session so consecutive Gemini calls reuse one TLS connection
+        self.session = requests.Session()
+        # Retries stay with backoff in _gemini_post, so the adapter itself does not retry
+        self.session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
+        # The key travels in a header, so each endpoint is a single constant URL
+        self._headers = {'Content-Type': 'application/json', 'x-goog-api-key': self.api_key}
+        self.session.headers.update(self._headers)
+        # httpx client for the async API; created by init() on the caller's event loop
+        self._client = None
         
         if not self.api_key:
-            print("[Service Init] WARNING: LLM API key not found. AI features are disabled.")
+            log.warning("LLM API key not found. AI features are disabled.")
         else:
-            print(f"[Service Init] LLM API key loaded.")
+            log.info("LLM API key loaded")
         
         # --- LOAD PROMPT FROM FILE (WITH FALLBACK) ---
-        self.parse_system_prompt = self._load_prompt("car_query.txt")
+        self.parse_system_prompt = _load_prompt("car_query.txt")
         
         # Fallback if file load failed
         if not self.parse_system_prompt:
-            print("[Service Init] Prompt file empty or missing. Using hardcoded fallback.")
+            log.warning("Prompt file empty or missing, using hardcoded fallback")
             self.parse_system_prompt = (
                 "You are a helpful assistant that extracts structured search parameters from a user's car search query. "
                 "The search will be conducted on Standvirtual. Output MUST be valid JSON. "
@@ -61,85 +336,202 @@ class CarSearchService:
             }
         }
 
-    def _load_prompt(self, filename: str) -> str:
+        # The parse prompt and schema never change, so encode that part of the body once
+        self._parse_payload_prefix = self._structured_payload_prefix(self.parse_system_prompt, self.parse_schema)
+
+    @staticmethod
+    def _structured_payload_prefix(system_instruction, response_schema) -> bytes:
         """
-        Robustly resolves the path to the prompts folder and loads the file.
+        Encodes the static part of a structured request, left open so that
+        _structured_body() can splice the user prompt in as bytes.
         """
-        try:
-            # 1. Resolve path relative to this file (services/car_search_system.py)
-            current_dir = Path(__file__).parent.resolve()
-            # Go up one level to project root, then into prompts
-            project_root = current_dir.parent
-            file_path = project_root / "prompts" / filename
-            
-            print(f"[Service Init] Loading prompt from: {file_path}")
-
-            if not file_path.exists():
-                print(f"[Service Init] ❌ File not found at: {file_path}")
-                return ""
+        static = _dumps({
+            "systemInstruction": {"parts": [{"text": system_instruction}]},
+            "generationConfig": {
+                "responseMimeType": "application/json",
+                "responseSchema": response_schema,
+                "temperature": 0.0
+            },
+        })
+        return static[:-1] + b',"contents":[{"parts":[{"text":'
 
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-                if content:
-                    print(f"[Service Init] ✅ Prompt loaded ({len(content)} chars).")
-                    return content
-                else:
-                    print(f"[Service Init] ⚠️ File found but empty: {filename}")
-                    return ""
-                    
-        except Exception as e:
-            print(f"[Service Init] Error loading prompt: {e}")
-            return ""
+    @staticmethod
+    def _structured_body(payload_prefix: bytes, user_prompt: str) -> bytes:
+        return payload_prefix + _dumps(user_prompt) + b'}]}]}'
+
+    def _model_url(self, model=None) -> str:
+        model = model or self.MODEL_CHAT
+        url = self._model_urls.get(model)
+        if url is None:
+            url = self._model_urls[model] = f"{self.API_BASE_URL}{model}:generateContent"
+        return url
 
-    def _call_gemini_structured(self, user_prompt, system_instruction, response_schema):
+    def _call_gemini_structured(self, user_prompt, system_instruction, response_schema, payload_prefix=None,
+                                bypass_cache=False, model=None):
         if not self.api_key:
             raise EnvironmentError("API key is not set.")
-        
-        @backoff.on_exception(
-            backoff.expo, 
-            (requests.exceptions.RequestException, json.JSONDecodeError), 
-            max_tries=5
-        )
-        def attempt_call():
-            payload = {
-                "contents": [{"parts": [{"text": user_prompt}]}],
-                "systemInstruction": {"parts": [{"text": system_instruction}]},
-                "generationConfig": { 
-                    "responseMimeType": "application/json",
-                    "responseSchema": response_schema,
-                    "temperature": 0.0
-                },
-            }
 
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(f"{self.api_url}?key={self.api_key}", headers=headers, data=json.dumps(payload))
-            
-            if response.status_code != 200:
-                print(f"[Gemini Error] Status: {response.status_code}. Response: {response.text[:200]}...")
-                response.raise_for_status() 
-            
-            result = response.json()
-            json_str = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '{}')
-            return json.loads(json_str)
+        # Structured calls run at temperature 0.0, so identical requests give identical answers
+        model = model or self.MODEL_CHAT
+        cache_key = llm_cache.make_key(model, system_instruction, user_prompt, response_schema, 0.0)
+        if not bypass_cache:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-        return attempt_call()
+        if payload_prefix is None:
+            payload_prefix = self._structured_payload_prefix(system_instruction, response_schema)
+
+        body = self._structured_body(payload_prefix, user_prompt)
+        result = _gemini_post(self.session, self._model_url(model), body)
+        llm_cache.put(cache_key, result)
+        return result
+
+    @staticmethod
+    def _to_int(number: str, thousands: str = None) -> int:
+        if re.fullmatch(r"\d+[.,]\d{1,2}", number):
+            # Decimal: "12,5k", "1.5 mil"
+            value = float(number.replace(",", "."))
+        else:
+            value = int(re.sub(r"[^\d]", "", number))
+        return int(value * 1000) if thousands else int(value)
+
+    def _fast_parse(self, user_query: str):
+        """
+        Regex-based parser for the common query shapes.
+        Returns the same dict as the LLM parser, or None when it is not
+        confident enough (no known brand, nothing besides the brand, or a
+        number it could not attribute).
+        """
+        filters, unparsed = self._regex_quick_parse(user_query)
+        if unparsed or not filters["brand"] or sum(value is not None for value in filters.values()) < 2:
+            return None
+        return filters
+
+    def _regex_quick_parse(self, user_query: str):
+        """
+        Best-effort regex extraction of every filter field; unmatched fields are None.
+
+        Returns:
+            Tuple of (filters, unparsed). unparsed holds the numbers it could not
+            attribute confidently: leftovers, bare years after a price keyword and
+            implausibly low prices ("até 15" with no unit). Non-empty means ambiguous.
+        """
+        text = user_query.lower()
+        filters = dict.fromkeys(self._FILTER_FIELDS)
+
+        # Brand (longest alias first, so "alfa romeo" wins over shorter names) and model
+        for alias in sorted(self._BRANDS, key=len, reverse=True):
+            match = re.search(rf"\b{re.escape(alias)}\b", text)
+            if match:
+                filters["brand"] = self._BRANDS[alias]
+                word_matches = list(self._RE_WORD.finditer(text, match.end()))[:2]
+                words = [w.group(0) for w in word_matches]
+                model_end = match.end()
+                if words and words[0] in self._MODEL_PREFIXES and len(words) > 1:
+                    filters["model"] = f"{words[0].title()} {words[1].upper()}"
+                    model_end = word_matches[1].end()
+                elif (words and words[0] not in self._NOT_MODEL and words[0] not in self._FUELS
+                        and not self._RE_YEAR.fullmatch(words[0])):
+                    filters["model"] = words[0].title() if words[0].isalpha() else words[0].upper()
+                    model_end = word_matches[0].end()
+                # Blank out brand and model so their digits ("320d", "308") are not read as numbers
+                text = text[:match.start()] + " " + text[model_end:]
+                break
+
+        # Strip km first so its numbers are not mistaken for prices or years
+        km_match = self._RE_KM.search(text)
+        if km_match:
+            filters["max_km"] = self._to_int(km_match.group(1), km_match.group(2))
+            text = text[:km_match.start()] + " " + text[km_match.end():]
+
+        # A bare 4-digit number after "até" / "max" / "entre" is as likely a year as a price
+        unparsed = []
+        price_match = self._RE_PRICE.search(text)
+        if price_match and (self._is_bare_year(price_match, 1) or self._is_bare_year(price_match, 4)):
+            # "from 2015 to 2018" is a year range, "2015 e 20000 euros" a year and a price
+            unparsed += [self._to_int(price_match.group(1), price_match.group(2)),
+                         self._to_int(price_match.group(4), price_match.group(5))]
+            text = text[:price_match.start()] + " " + text[price_match.end():]
+        elif price_match:
+            filters["min_price"] = self._to_int(price_match.group(1), price_match.group(2))
+            filters["max_price"] = self._to_int(price_match.group(4), price_match.group(5))
+            text = text[:price_match.start()] + " " + text[price_match.end():]
+        else:
+            for key, pattern in (("max_price", self._RE_PRICE_MAX), ("min_price", self._RE_PRICE_MIN)):
+                bound_match = pattern.search(text)
+                if not bound_match:
+                    continue
+                value = self._to_int(bound_match.group(1), bound_match.group(2))
+                if self._is_bare_year(bound_match, 1):
+                    unparsed.append(value)
+                else:
+                    filters[key] = value
+                text = text[:bound_match.start()] + " " + text[bound_match.end():]
+
+        year_match = self._RE_YEAR.search(text)
+        if year_match:
+            filters["min_year"] = int(year_match.group(0))
+            text = text[:year_match.start()] + " " + text[year_match.end():]
+
+        for word in self._RE_WORD.findall(text):
+            if word in self._FUELS and not filters["fuel"]:
+                filters["fuel"] = self._FUELS[word]
+            elif word in self._LOCATIONS and not filters["location"]:
+                filters["location"] = self._LOCATIONS[word]
+
+        # Leftover numbers, normalised ("10k" -> 10000) where they parse as one
+        unparsed += [self._to_int(m.group(1), m.group(2)) for m in self._RE_BARE_NUMBER.finditer(text)]
+        unparsed += [int(digits) for digits in self._RE_NUMBER.findall(self._RE_BARE_NUMBER.sub(" ", text))]
+        for key in ("min_price", "max_price"):
+            if filters[key] is not None and filters[key] < self.MIN_PLAUSIBLE_PRICE:
+                # "até 15": probably thousands, but not safe to guess
+                unparsed.append(filters[key])
+                filters[key] = None
+        return filters, tuple(sorted(unparsed))
+
+    def _query_namespace(self, user_query: str) -> tuple:
+        """Semantic-cache namespace: the query's fuel, location and numbers as the regex parser normalises them."""
+        filters, unparsed = self._regex_quick_parse(user_query)
+        return tuple(filters[key] for key in self._NAMESPACE_FIELDS) + unparsed
+
+    def _is_bare_year(self, match, group: int) -> bool:
+        """True when the number captured at `group` has no k/mil unit, no currency, and reads as a year."""
+        return (not (match.group(group + 1) or match.group(group + 2))
+                and bool(self._RE_YEAR.fullmatch(match.group(group))))
 
     @observe(as_type="generation")
     def parse_query(self, user_query: str) -> Dict[str, Any]:
+        filters = self._fast_parse(user_query)
+        if filters is not None:
+            log.debug("Parsed filters locally: %s", filters)
+            return filters
+
+        namespace = self._query_namespace(user_query)
+        cached = _query_cache.lookup(user_query, namespace)
+        if cached is not None:
+            log.debug("Reusing filters of a similar query: %s", cached)
+            return dict(cached)
+
         if not self.api_key: return {}
         try:
-            filters = self._call_gemini_structured(user_query, self.parse_system_prompt, self.parse_schema)
-            print(f"[parse_query] Parsed filters: {filters}")
+            filters = self._call_gemini_structured(
+                user_query, self.parse_system_prompt, self.parse_schema,
+                payload_prefix=self._parse_payload_prefix, model=self.MODEL_EXTRACT
+            )
+            log.debug("Parsed filters: %s", filters)
+            if filters:
+                _query_cache.add(user_query, filters, namespace)
             return filters
         except Exception as e:
-            print(f"[parse_query] Error parsing query: {e}")
+            log.error("Error parsing query: %s", e)
             return {}
 
     @observe(as_type="span")
     def search_cars(self, filters: dict) -> list:
         cleaned = {k: v for k, v in filters.items() if v is not None}
         try:
-            print(f"[Scraper] Search initiated for: {cleaned}")
+            log.debug("Search initiated for: %s", cleaned)
             return self.scraper.search(
                 brand=cleaned.get('brand', ''), 
                 model=cleaned.get('model', ''), 
@@ -148,13 +540,30 @@ class CarSearchService:
                 min_year=cleaned.get('min_year')
             )
         except Exception as e:
-            print(f"[search_cars] Error during scraping: {e}")
+            log.error("Error during scraping: %s", e)
             return []
 
     @observe(as_type="generation")
-    def rank_and_annotate(self, user_query: str, results: list) -> list:
+    def rank_and_annotate(self, user_query: str, results: list, filters: dict = None) -> list:
         if not self.api_key or not results: return results 
-        cars_to_process = results[:15]
+
+        # Ranking a handful of listings is moot; annotate locally and skip the LLM call
+        if len(results) <= self.SMALL_RESULT_SET:
+            for car in results:
+                car.setdefault('ai_description', "Matches your search criteria.")
+            return results
+
+        cars_to_process, prompt, system_instr, response_schema = self._rank_request(user_query, results, filters)
+
+        try:
+            processed_data = self._call_gemini_structured(prompt, system_instr, response_schema)
+            return self._apply_ranking(cars_to_process, processed_data)
+        except Exception as e:
+            log.error("Ranking failed: %s", e)
+            return results 
+
+    def _rank_request(self, user_query: str, results: list, filters: dict = None):
+        cars_to_process = _prefilter(results, filters)
         
         system_instr = (
             "You are a personalized car shopping assistant. "
@@ -163,11 +572,14 @@ class CarSearchService:
         )
 
         simplified_input = [
-            {"id": i, "title": c['title'], "price": c['price'], "year": c['year'], "km": c['km']} 
+            {"id": i, **_compact_for_llm(c)}
             for i, c in enumerate(cars_to_process)
         ]
 
-        prompt = f"User Query: '{user_query}'\n\nListings to Rank:\n{json.dumps(simplified_input)}"
+        prompt = (
+            f"User Query: '{user_query}'\n\n"
+            f"Listings to Rank (t=title, p=price €, y=year, k=km, f=fuel):\n{_dumps(simplified_input).decode()}"
+        )
 
         response_schema = {
             "type": "OBJECT",
@@ -184,77 +596,442 @@ class CarSearchService:
                 }
             }
         }
+        return cars_to_process, prompt, system_instr, response_schema
 
+    @staticmethod
+    def _apply_ranking(cars_to_process: list, processed_data: dict) -> list:
+        new_ordered_list = []
+        for item in processed_data.get("ranked_cars", []):
+            original_index = item.get("original_id")
+            if original_index is not None and 0 <= original_index < len(cars_to_process):
+                car = cars_to_process[original_index]
+                car['ai_description'] = item.get("ai_description", "Matches your search criteria.")
+                new_ordered_list.append(car)
+        
+        if len(new_ordered_list) < len(cars_to_process):
+            used_ids = {item.get("original_id") for item in processed_data.get("ranked_cars", [])}
+            for i, car in enumerate(cars_to_process):
+                if i not in used_ids:
+                    car['ai_description'] = "Also found matching your criteria."
+                    new_ordered_list.append(car)
+        return new_ordered_list
+
+    def _combined_request(self, user_query: str, results: list, context_text: str = "", filters: dict = None):
+        cars_to_process, rank_prompt, rank_instr, response_schema = self._rank_request(user_query, results, filters)
+
+        system_instr = (
+            f"{rank_instr} "
+            "Then, acting as a savvy car market expert, write a concise 'market_summary' of the listings: "
+            "highlight price range, best value option, and red flags. "
+            "Reference user document context if provided."
+        )
+        context_block = f"USER CONTEXT (Insurance/Prefs):\n{context_text[:_MAX_CTX]}\n\n" if context_text else ""
+        prompt = f"{context_block}{rank_prompt}"
+
+        combined_schema = {
+            "type": "OBJECT",
+            "properties": {
+                **response_schema["properties"],
+                "market_summary": {"type": "STRING"}
+            }
+        }
+        return cars_to_process, prompt, system_instr, combined_schema
+
+    @observe(as_type="generation")
+    def rank_summarize_combined(self, user_query: str, results: list, context_text: str = "", filters: dict = None):
+        """
+        Ranks, annotates and summarises the listings in a single structured Gemini call.
+        When the parsed filters are given, only the listings closest to them are sent.
+
+        Returns:
+            Tuple of (ranked results, market summary)
+        """
+        if not self.api_key or not results: return results, "Unable to generate summary."
+
+        # Nothing to rank: only the summary needs the LLM
+        if len(results) <= self.SMALL_RESULT_SET:
+            return self.rank_and_annotate(user_query, results), self.summarize_results(results, context_text)
+
+        cars_to_process, prompt, system_instr, response_schema = self._combined_request(
+            user_query, results, context_text, filters
+        )
         try:
             processed_data = self._call_gemini_structured(prompt, system_instr, response_schema)
-            new_ordered_list = []
-            for item in processed_data.get("ranked_cars", []):
-                original_index = item.get("original_id")
-                if original_index is not None and 0 <= original_index < len(cars_to_process):
-                    car = cars_to_process[original_index]
-                    car['ai_description'] = item.get("ai_description", "Matches your search criteria.")
-                    new_ordered_list.append(car)
-            
-            if len(new_ordered_list) < len(cars_to_process):
-                used_ids = {item.get("original_id") for item in processed_data.get("ranked_cars", [])}
-                for i, car in enumerate(cars_to_process):
-                    if i not in used_ids:
-                        car['ai_description'] = "Also found matching your criteria."
-                        new_ordered_list.append(car)
-            return new_ordered_list
+            summary = processed_data.get("market_summary") or "Analysis unavailable."
+            return self._apply_ranking(cars_to_process, processed_data), summary
         except Exception as e:
-            print(f"[rank_and_annotate] Error: {e}")
-            return results 
+            log.error("Combined ranking/summary failed: %s", e)
+            return results, f"Error summarizing: {e}"
 
     @observe(as_type="generation")
     def summarize_results(self, results: list, context_text: str = "") -> str:
         if not self.api_key or not results: return "Unable to generate summary."
 
+        try:
+            payload = self._summary_payload(results, context_text)
+            response = self.session.post(self.api_url, data=_dumps(payload), timeout=30)
+            if response.status_code != 200: return "Error generating summary."
+            return _loads(response.content).get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', 'Analysis unavailable.')
+        except Exception as e:
+            return f"Error summarizing: {e}"
+
+    def _summary_payload(self, results: list, context_text: str = "") -> dict:
         system_instr = (
             "You are a savvy car market expert. Review the listings and generate a concise summary. "
             "Highlight price range, best value option, and red flags. "
             "Reference user document context if provided."
         )
         
-        context_block = f"\n\nUSER CONTEXT (Insurance/Prefs):\n{context_text}\n" if context_text else ""
-        results_sample = json.dumps(results[:15], indent=2)
-        full_prompt = f"{context_block}\n\nMARKET DATA:\n{results_sample}\n\nPlease provide a market snapshot:"
+        context_block = f"\n\nUSER CONTEXT (Insurance/Prefs):\n{context_text[:_MAX_CTX]}\n" if context_text else ""
+        results_sample = _listings_for_llm(results)
+        full_prompt = f"{context_block}\n\nMARKET DATA (t=title, p=price €, y=year, k=km, f=fuel):\n{results_sample}\n\nPlease provide a market snapshot:"
 
+        return {
+            "contents": [{"parts": [{"text": full_prompt}]}],
+            "systemInstruction": {"parts": [{"text": system_instr}]},
+            "generationConfig": {"temperature": 0.7}
+        }
+
+    def _stream_text(self, payload: dict) -> Iterator[str]:
+        """
+        Posts to the SSE streaming endpoint and yields text chunks as they arrive.
+        """
+        with self.session.post(
+            self._sse_url,
+            data=_dumps(payload), stream=True, timeout=30
+        ) as response:
+            if response.status_code != 200:
+                log.error("Gemini error %s: %.200s", response.status_code, response.text)
+                response.raise_for_status()
+
+            # Raw bytes: text/event-stream carries no charset, so requests would decode as ISO-8859-1
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                chunk = _loads(line[len(b"data:"):])
+                text = chunk.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
+                if text:
+                    yield text
+
+    def _chat_payload(self, question: str, results: list, context_text: str = "") -> dict:
+        chat_system_prompt = "You are a car analyst. Answer based ONLY on the provided listings."
+        context_block = f"\n\nDOCUMENT CONTEXT:\n{context_text[:_MAX_CTX]}\n" if context_text else ""
+        results_json = _listings_for_llm(results)
+        full_prompt = f"{context_block}\n\nCAR LISTINGS (JSON; t=title, p=price €, y=year, k=km, f=fuel):\n{results_json}\n\nUSER QUESTION: {question}"
+
+        return {
+            "contents": [{"parts": [{"text": full_prompt}]}],
+            "systemInstruction": {"parts": [{"text": chat_system_prompt}]},
+            "generationConfig": {"temperature": 0.5}
+        }
+
+    @observe(as_type="generation")
+    def chat_about_results(self, question: str, results: list, context_text: str = "") -> str:
+        if not self.api_key: return "API key missing."
+        
         try:
-            payload = {
-                "contents": [{"parts": [{"text": full_prompt}]}],
-                "systemInstruction": {"parts": [{"text": system_instr}]},
-                "generationConfig": {"temperature": 0.7}
-            }
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(f"{self.api_url}?key={self.api_key}", headers=headers, data=json.dumps(payload))
-            if response.status_code != 200: return "Error generating summary."
-            return response.json().get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', 'Analysis unavailable.')
+            payload = self._chat_payload(question, results, context_text)
+            response = self.session.post(self.api_url, data=_dumps(payload), timeout=30)
+            return _loads(response.content).get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', 'Error generating response.')
+        except Exception as e:
+            return f"Error: {e}"
+
+    @observe(as_type="generation")
+    def stream_chat(self, question: str, results: list, context_text: str = "") -> Iterator[str]:
+        """
+        Streaming variant of chat_about_results, for st.write_stream.
+        """
+        if not self.api_key:
+            yield "API key missing."
+            return
+
+        try:
+            payload = self._chat_payload(question, results, context_text)
+            yield from self._stream_text(payload)
+        except Exception as e:
+            yield f"Error: {e}"
+
+    # --- ASYNC API (httpx) ---
+
+    async def init(self):
+        """
+        Opens the httpx.AsyncClient used by the *_async methods. With HTTP/2,
+        concurrent Gemini calls are multiplexed over a single TLS connection.
+        Must be awaited on the event loop that will make the calls.
+        """
+        if httpx is None:
+            raise RuntimeError("httpx is not installed; the async API is unavailable.")
+        if self._client is None or self._client.is_closed:
+            options = dict(
+                headers=self._headers,
+                timeout=60,
+                limits=httpx.Limits(max_connections=16),
+            )
+            try:
+                self._client = httpx.AsyncClient(http2=True, **options)
+            except ImportError:
+                # http2=True needs the optional 'h2' package (httpx[http2])
+                self._client = httpx.AsyncClient(**options)
+        return self
+
+    async def _call_gemini_structured_async(self, user_prompt, system_instruction, response_schema,
+                                            payload_prefix=None, bypass_cache=False, model=None):
+        if not self.api_key:
+            raise EnvironmentError("API key is not set.")
+
+        model = model or self.MODEL_CHAT
+        cache_key = llm_cache.make_key(model, system_instruction, user_prompt, response_schema, 0.0)
+        if not bypass_cache:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        await self.init()
+        if payload_prefix is None:
+            payload_prefix = self._structured_payload_prefix(system_instruction, response_schema)
+
+        body = self._structured_body(payload_prefix, user_prompt)
+        result = await _gemini_post_async(self._client, self._model_url(model), body)
+        llm_cache.put(cache_key, result)
+        return result
+
+    async def _generate_text_async(self, payload: dict, default: str) -> str:
+        await self.init()
+        response = await self._client.post(self.api_url, content=_dumps(payload))
+        if response.status_code != 200:
+            return f"Gemini API error ({response.status_code})."
+        data = _loads(response.content)
+        return data.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', default)
+
+    @observe(as_type="generation")
+    async def parse_query_async(self, user_query: str) -> Dict[str, Any]:
+        filters = self._fast_parse(user_query)
+        if filters is not None:
+            return filters
+
+        # Embedding (and the first-call model load) is CPU/disk bound: keep it off the event loop
+        namespace = self._query_namespace(user_query)
+        cached = await asyncio.to_thread(_query_cache.lookup, user_query, namespace)
+        if cached is not None:
+            return dict(cached)
+
+        if not self.api_key: return {}
+        try:
+            filters = await self._call_gemini_structured_async(
+                user_query, self.parse_system_prompt, self.parse_schema,
+                payload_prefix=self._parse_payload_prefix, model=self.MODEL_EXTRACT
+            )
+            log.debug("Parsed filters: %s", filters)
+            if filters:
+                await asyncio.to_thread(_query_cache.add, user_query, filters, namespace)
+            return filters
+        except Exception as e:
+            log.error("Error parsing query: %s", e)
+            return {}
+
+    @observe(as_type="generation")
+    async def rank_and_annotate_async(self, user_query: str, results: list, filters: dict = None) -> list:
+        if not self.api_key or not results: return results
+
+        if len(results) <= self.SMALL_RESULT_SET:
+            for car in results:
+                car.setdefault('ai_description', "Matches your search criteria.")
+            return results
+
+        cars_to_process, prompt, system_instr, response_schema = self._rank_request(user_query, results, filters)
+        try:
+            processed_data = await self._call_gemini_structured_async(prompt, system_instr, response_schema)
+            return self._apply_ranking(cars_to_process, processed_data)
+        except Exception as e:
+            log.error("Ranking failed: %s", e)
+            return results
+
+    @observe(as_type="generation")
+    async def summarize_results_async(self, results: list, context_text: str = "") -> str:
+        if not self.api_key or not results: return "Unable to generate summary."
+        try:
+            return await self._generate_text_async(self._summary_payload(results, context_text), 'Analysis unavailable.')
         except Exception as e:
             return f"Error summarizing: {e}"
 
     @observe(as_type="generation")
-    def chat_about_results(self, question: str, results: list, context_text: str = "") -> str:
+    async def chat_about_results_async(self, question: str, results: list, context_text: str = "") -> str:
         if not self.api_key: return "API key missing."
-        
-        chat_system_prompt = "You are a car analyst. Answer based ONLY on the provided listings."
-        context_block = f"\n\nDOCUMENT CONTEXT:\n{context_text}\n" if context_text else ""
-        results_json = json.dumps(results[:15], indent=2)
-        full_prompt = f"{context_block}\n\nCAR LISTINGS (JSON):\n{results_json}\n\nUSER QUESTION: {question}"
-        
         try:
-            payload = {
-                "contents": [{"parts": [{"text": full_prompt}]}],
-                "systemInstruction": {"parts": [{"text": chat_system_prompt}]},
-                "generationConfig": {"temperature": 0.5}
-            }
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(f"{self.api_url}?key={self.api_key}", headers=headers, data=json.dumps(payload))
-            return response.json().get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', 'Error generating response.')
+            payload = self._chat_payload(question, results, context_text)
+            return await self._generate_text_async(payload, 'Error generating response.')
         except Exception as e:
             return f"Error: {e}"
-            
-    def __del__(self):
+
+    async def _stream_text_async(self, payload: dict) -> AsyncIterator[str]:
+        """
+        Async SSE reader for streamGenerateContent; yields text chunks as they arrive.
+        """
+        await self.init()
+        async with self._client.stream("POST", self._sse_url, content=_dumps(payload)) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode("utf-8", "replace")
+                log.error("Gemini error %s: %.200s", response.status_code, body)
+                response.raise_for_status()
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                chunk = _loads(line[len("data:"):])
+                text = chunk.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
+                if text:
+                    yield text
+
+    async def stream_summary_async(self, results: list, context_text: str = "") -> AsyncIterator[str]:
+        """
+        Streaming variant of summarize_results_async.
+        """
+        if not self.api_key or not results:
+            yield "Unable to generate summary."
+            return
+        try:
+            async for text in self._stream_text_async(self._summary_payload(results, context_text)):
+                yield text
+        except Exception as e:
+            yield f"Error summarizing: {e}"
+
+    async def stream_chat_async(self, question: str, results: list, context_text: str = "") -> AsyncIterator[str]:
+        """
+        Streaming variant of chat_about_results_async.
+        """
+        if not self.api_key:
+            yield "API key missing."
+            return
+        try:
+            async for text in self._stream_text_async(self._chat_payload(question, results, context_text)):
+                yield text
+        except Exception as e:
+            yield f"Error: {e}"
+
+    async def search_cars_async(self, filters: dict) -> list:
+        # Result pages are fetched concurrently over HTTP; the scraper itself
+        # falls back to Selenium (in a worker thread) for JS-rendered pages
+        cleaned = {k: v for k, v in filters.items() if v is not None}
+        try:
+            log.debug("Async search initiated for: %s", cleaned)
+            return await self.scraper.search_async(
+                brand=cleaned.get('brand', ''),
+                model=cleaned.get('model', ''),
+                min_price=cleaned.get('min_price'),
+                max_price=cleaned.get('max_price'),
+                min_year=cleaned.get('min_year')
+            )
+        except Exception as e:
+            log.error("Error during scraping: %s", e)
+            return []
+
+    _SCRAPE_KEYS = ("brand", "model", "min_price", "max_price", "min_year")
+
+    @classmethod
+    def _same_scrape(cls, filters: dict, quick_filters: dict) -> bool:
+        """True when both filter sets would produce the same scraper request."""
+        def norm(value):
+            return value.lower() if isinstance(value, str) else value
+        return all(norm(filters.get(k)) == norm(quick_filters.get(k)) for k in cls._SCRAPE_KEYS)
+
+    async def handle_query(self, user_query: str, context_text: str = "") -> Dict[str, Any]:
+        """
+        Full search pipeline: parse, scrape, rank and summarise.
+        While the LLM parses the query, a speculative scrape runs with the
+        regex-extracted filters when they include a brand; it is only redone
+        if the LLM disagrees. If the LLM parse fails, the regex filters are used.
+
+        Returns:
+            Dict with "filters", "results" and "summary"
+        """
+        filters = self._fast_parse(user_query)
+        if filters is not None:
+            results = await self.search_cars_async(filters)
+        else:
+            quick_filters, unparsed = self._regex_quick_parse(user_query)
+            parse_task = asyncio.create_task(self.parse_query_async(user_query))
+            scrape_task = None
+            # Without a regex brand the LLM infers one ("golf 2015" -> VW), so the
+            # speculative scrape would almost always be discarded
+            if quick_filters["brand"] and not unparsed:
+                scrape_task = asyncio.create_task(self.search_cars_async(quick_filters))
+
+            filters = await parse_task
+            if not filters:
+                # No API key or LLM error: the regex filters beat an unfiltered scrape
+                filters = quick_filters
+            # The scrape thread cannot be cancelled and shares one browser, so always let it finish
+            speculative = await scrape_task if scrape_task is not None else None
+            if speculative is not None and self._same_scrape(filters, quick_filters):
+                results = speculative
+            else:
+                results = await self.search_cars_async(filters)
+
+        if not results:
+            return {"filters": filters, "results": [], "summary": ""}
+
+        ranked, summary = await self.rank_summarize_combined_async(user_query, results, context_text, filters)
+        return {"filters": filters, "results": ranked, "summary": summary}
+
+    @observe(as_type="generation")
+    async def rank_summarize_combined_async(self, user_query: str, results: list, context_text: str = "",
+                                            filters: dict = None):
+        """
+        Async variant of rank_summarize_combined.
+
+        Returns:
+            Tuple of (ranked results, market summary)
+        """
+        if not self.api_key or not results: return results, "Unable to generate summary."
+
+        if len(results) <= self.SMALL_RESULT_SET:
+            return await asyncio.gather(
+                self.rank_and_annotate_async(user_query, results),
+                self.summarize_results_async(results, context_text),
+            )
+
+        cars_to_process, prompt, system_instr, response_schema = self._combined_request(
+            user_query, results, context_text, filters
+        )
         try:
-            if hasattr(self, 'scraper'): del self.scraper
-        except: pass
\ No newline at end of file
+            processed_data = await self._call_gemini_structured_async(prompt, system_instr, response_schema)
+            summary = processed_data.get("market_summary") or "Analysis unavailable."
+            return self._apply_ranking(cars_to_process, processed_data), summary
+        except Exception as e:
+            log.error("Combined ranking/summary failed: %s", e)
+            return results, f"Error summarizing: {e}"
+
+    def close(self):
+        """
+        Shuts down the scraper's browser. Safe to call more than once.
+        """
+        try:
+            self.scraper.close()
+        except Exception as e:
+            log.warning("Error closing scraper: %s", e)
+        self.session.close()
+
+    async def aclose(self):
+        """
+        Async counterpart of close(): also closes the async HTTP clients.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        try:
+            await self.scraper.aclose()
+        except Exception as e:
+            log.warning("Error closing scraper client: %s", e)
+        await asyncio.to_thread(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    async def __aenter__(self):
+        return await self.init()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
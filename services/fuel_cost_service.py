@@ -1,18 +1,52 @@
+from functools import lru_cache
+from types import MappingProxyType
 
-from tools.fuel_tools import calculate_fuel_cost, calculate_additional_consumption
+import numpy as np
 
-class FuelCostAnalysisService:
-    
-    def analyze(self, km_per_month, avg_consumption, fuel_price, avg_person_weight=None, num_people=None):
-        result = calculate_fuel_cost(
-            km_per_month, avg_consumption, fuel_price
+from tools.fuel_tools import calculate_fuel_cost, calculate_additional_consumption, calculate_fuel_cost_batch
+
+
+@lru_cache(maxsize=1024)
+def _analyze_cached(km_per_month, avg_consumption, fuel_price, avg_person_weight, num_people):
+    result = dict(calculate_fuel_cost(
+        km_per_month, avg_consumption, fuel_price
+    ))
+
+    additional = 0
+    if avg_person_weight and num_people:
+        additional = calculate_additional_consumption(avg_person_weight, num_people)
+
+    result["additional_consumption"] = additional
+    result["final_consumption"] = avg_consumption + additional
+
+    return MappingProxyType(result)
+
+
+def _analyze_batch(km_per_month, avg_consumption, fuel_price, avg_person_weight, num_people) -> dict:
+    costs = calculate_fuel_cost_batch(km_per_month, avg_consumption, fuel_price)
+
+    additional = np.zeros_like(costs.liters)
+    if avg_person_weight is not None and num_people is not None:
+        # Arrays are unhashable, so call the uncached function underneath lru_cache
+        additional = additional + calculate_additional_consumption.__wrapped__(
+            np.asarray(avg_person_weight, dtype=np.float64), np.asarray(num_people, dtype=np.float64)
         )
 
-        additional = 0
-        if avg_person_weight and num_people:
-            additional = calculate_additional_consumption(avg_person_weight, num_people)
+    return {
+        "liters_used": costs.liters,
+        "monthly_cost": costs.monthly,
+        "yearly_cost": costs.yearly,
+        "additional_consumption": additional,
+        "final_consumption": np.asarray(avg_consumption, dtype=np.float64) + additional,
+    }
+
 
-        result["additional_consumption"] = additional
-        result["final_consumption"] = avg_consumption + additional
+class FuelCostAnalysisService:
+    
+    def analyze(self, km_per_month, avg_consumption, fuel_price, avg_person_weight=None, num_people=None):
+        # Many cars at once (array inputs): vectorized path, same keys holding arrays
+        if any(isinstance(arg, np.ndarray) for arg in (km_per_month, avg_consumption, fuel_price)):
+            return _analyze_batch(km_per_month, avg_consumption, fuel_price, avg_person_weight, num_people)
 
-        return result
+        # Cached results are shared, so hand callers their own mutable copy
+        return dict(_analyze_cached(km_per_month, avg_consumption, fuel_price, avg_person_weight, num_people))
@@ -1,7 +1,34 @@
-import os
 import json
-import requests
-from utils.ai import call_gemini
+import logging
+import os
+from utils.ai import call_gemini_structured, MODEL_EXTRACT
+
+try:
+    import orjson
+
+    def _compact_json(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    def _compact_json(obj) -> str:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+log = logging.getLogger(__name__)
+
+OFFER_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "price_position": {"type": "STRING"},
+        "suggested_discount_eur": {"type": "INTEGER"},
+        "justification": {"type": "STRING"},
+        "scam_risk_score": {"type": "INTEGER"},
+        "scam_reasons": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "buyer_message": {"type": "STRING"}
+    },
+    "required": [
+        "price_position", "suggested_discount_eur", "justification",
+        "scam_risk_score", "scam_reasons", "buyer_message"
+    ]
+}
 
 
 class OfferAnalysisService:
@@ -15,12 +42,15 @@ class OfferAnalysisService:
 
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        self.model = "gemini-1.5-flash"
+        self.model = MODEL_EXTRACT
 
     def analyze(self, description, price, mileage, year, recent_results=None):
         """
         Uses Gemini to analyze a car offer.
         """
+        # No similarity cache here: one added red flag ("pagamento por Western Union")
+        # barely moves the embedding but must change the risk score. Identical
+        # requests are still served by the exact-match cache in call_gemini_structured.
 
         # Prepare recent market data (optional)
         market_sample = []
@@ -36,7 +66,7 @@ class OfferAnalysisService:
         prompt = f"""
 You are a professional used-car market analyst.
 
-Your task: Evaluate the offer and return a JSON object with:
+Your task: Evaluate the offer and fill in:
 - price_position (string)
 - suggested_discount_eur (integer)
 - justification (string)
@@ -51,36 +81,21 @@ Mileage: {mileage} km
 Year: {year}
 
 RECENT MARKET RESULTS (from user search):
-{json.dumps(market_sample, indent=2)}
-
-Now output JSON ONLY in this format:
-
-{{
-  "price_position": "...",
-  "suggested_discount_eur": 0,
-  "justification": "...",
-  "scam_risk_score": 0,
-  "scam_reasons": ["..."],
-  "buyer_message": "..."
-}}
+{_compact_json(market_sample)}
 """
 
-        # Call Gemini using existing helper
-        llm_response = call_gemini(prompt)
-
-        # LLM sometimes prints explanation before JSON → extract JSON safely
+        # Structured output guarantees the JSON shape, so no manual extraction is needed
         try:
-            start = llm_response.index("{")
-            end = llm_response.rindex("}") + 1
-            json_text = llm_response[start:end]
-            data = json.loads(json_text)
-            return data
-        except Exception:
+            data = call_gemini_structured(prompt, OFFER_SCHEMA, model=self.model)
+        except Exception as e:
+            log.warning("Offer analysis failed: %s", e)
             return {
                 "price_position": "Unable to determine.",
                 "suggested_discount_eur": 0,
-                "justification": "AI returned invalid format.",
+                "justification": "AI analysis is currently unavailable.",
                 "scam_risk_score": 50,
-                "scam_reasons": ["Could not parse AI output."],
+                "scam_reasons": ["Could not analyze the offer."],
                 "buyer_message": "Desculpa — não consegui analisar a oferta."
             }
+
+        return data
@@ -0,0 +1,67 @@
+"""
+Miss / put / hit / expiry round trips for utils.llm_cache against a temporary diskcache.
+"""
+from collections import OrderedDict
+
+import pytest
+
+diskcache = pytest.importorskip("diskcache")
+
+from utils import llm_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    disk = diskcache.Cache(str(tmp_path))
+    monkeypatch.setattr(llm_cache, "_disk", disk)
+    monkeypatch.setattr(llm_cache, "_memory", OrderedDict())
+    yield llm_cache
+    disk.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # diskcache reads the same time.time() as llm_cache, so one fake clock drives both
+    now = [1_000_000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+
+KEY = llm_cache.make_key("model", "system", "prompt", {"type": "OBJECT"}, 0.0)
+
+
+def test_miss_returns_none(cache):
+    assert cache.get(KEY) is None
+    assert not cache._memory
+
+
+def test_put_then_hit_from_memory_and_disk(cache):
+    cache.put(KEY, {"brand": "BMW"})
+    assert cache.get(KEY) == {"brand": "BMW"}
+
+    cache._memory.clear()
+    assert cache.get(KEY) == {"brand": "BMW"}
+    assert KEY in cache._memory
+
+
+def test_get_returns_a_copy(cache):
+    cache.put(KEY, {"brand": "BMW"})
+    cache.get(KEY)["brand"] = "Audi"
+    assert cache.get(KEY) == {"brand": "BMW"}
+
+
+def test_empty_values_are_not_stored(cache):
+    for value in (None, {}, [], ""):
+        cache.put(KEY, value)
+    assert cache.get(KEY) is None
+
+
+def test_entries_expire(cache, clock):
+    cache.put(KEY, {"brand": "BMW"}, ttl=60)
+    clock[0] += 30
+    assert cache.get(KEY) == {"brand": "BMW"}
+
+    clock[0] += 31
+    assert cache.get(KEY) is None
+    cache._memory.clear()
+    assert cache.get(KEY) is None
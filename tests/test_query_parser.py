@@ -0,0 +1,66 @@
+"""
+Query → filters table for the local regex parser (CarSearchService._fast_parse).
+Queries it cannot parse confidently must return None so they go to the LLM.
+"""
+import pytest
+
+from services.car_search_system import CarSearchService
+
+
+@pytest.fixture(scope="module")
+def service():
+    # The parser only uses class-level tables; skip __init__ (browser, HTTP session)
+    return CarSearchService.__new__(CarSearchService)
+
+
+def _filters(**fields):
+    filters = dict.fromkeys(CarSearchService._FILTER_FIELDS)
+    filters.update(fields)
+    return filters
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("bmw série 3 até 15 mil euros", _filters(brand="BMW", model="Série 3", max_price=15000)),
+    ("renault megane diesel até 150 000 km", _filters(brand="Renault", model="Megane", max_km=150000, fuel="Diesel")),
+    ("peugeot 308 sw 2018 gasóleo", _filters(brand="Peugeot", model="308", min_year=2018, fuel="Diesel")),
+    ("tesla model 3", _filters(brand="Tesla", model="Model 3")),
+    ("bmw 320d under 10k", _filters(brand="BMW", model="320D", max_price=10000)),
+    ("opel corsa até 7.500€", _filters(brand="Opel", model="Corsa", max_price=7500)),
+    ("audi a4 2016 até 15 000€ lisboa", _filters(brand="Audi", model="A4", max_price=15000, min_year=2016, location="Lisboa")),
+    ("mercedes classe c entre 20 mil e 30 mil", _filters(brand="Mercedes-Benz", model="Classe C", min_price=20000, max_price=30000)),
+    ("toyota yaris 2019 max 80 000 km", _filters(brand="Toyota", model="Yaris", min_year=2019, max_km=80000)),
+    ("fiat 500 híbrido setúbal", _filters(brand="Fiat", model="500", fuel="Híbrido", location="Setúbal")),
+])
+def test_fast_parse(service, query, expected):
+    assert service._fast_parse(query) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "golf 2015",                    # no brand
+    "vw golf até 15",               # implausible price (no unit)
+    "bmw 320d 2015 15000",          # bare number: price or km?
+    "seat leon from 2015 to 2018",  # second year left over
+    "audi a4 até 2015",             # bare year after "até": year or price?
+    "bmw 320d max 2018",
+    "bmw x5 2015 e 20000 euros",    # year-or-price on one end of the range
+])
+def test_fast_parse_defers_to_llm(service, query):
+    assert service._fast_parse(query) is None
+
+
+@pytest.mark.parametrize("first, second", [
+    ("cheap car under 10k", "cheap car até 10000€"),
+    ("carro barato até 15 mil porto", "carro económico porto até 15.000 euros"),
+])
+def test_query_namespace_matches_rephrasings(service, first, second):
+    assert service._query_namespace(first) == service._query_namespace(second)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("golf diesel", "golf gasolina"),
+    ("cheap car porto", "cheap car lisboa"),
+    ("cheap car under 10k", "cheap car under 20k"),
+    ("golf até 15", "golf até 25"),
+])
+def test_query_namespace_separates_filters(service, first, second):
+    assert service._query_namespace(first) != service._query_namespace(second)
@@ -0,0 +1,148 @@
+"""
+Content extractors for Standvirtual pages.
+A ContentExtractor turns fetched HTML into the compact car dicts the rest of
+the app uses, so raw markup never reaches the LLM prompts. The default is a
+BeautifulSoup parser.
+"""
+import logging
+import re
+from abc import ABC, abstractmethod
+
+from bs4 import BeautifulSoup
+
+log = logging.getLogger(__name__)
+
+
+class ContentExtractor(ABC):
+    """
+    Interface for turning Standvirtual pages into car dicts.
+    """
+
+    @abstractmethod
+    def parse_results(self, html: str) -> list:
+        """
+        Extracts the listing cards of a search results page.
+
+        Returns:
+            List of {title, price, year, km, fuel, link, image_url} dicts;
+            empty when the page has no listings (e.g. it is JS-rendered)
+        """
+
+
+class SoupExtractor(ContentExtractor):
+    """
+    Default extractor: BeautifulSoup over the server-rendered HTML.
+    - FIX: Advanced Price Extraction (Traverses up from currency symbol).
+    """
+
+    def __init__(self, max_articles: int = 40):
+        self.max_articles = max_articles
+
+    def parse_results(self, html: str) -> list:
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        results = []
+        articles = soup.find_all("article")
+        
+        log.debug("Found %d items", len(articles))
+
+        for article in articles[:self.max_articles]: 
+            try:
+                # --- A. Link & Title ---
+                link_tag = article.find("a", href=True)
+                if not link_tag: continue
+                
+                link = link_tag['href']
+                
+                # Title strategy
+                title = "No Title"
+                heading = article.find(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+                if heading:
+                    title = heading.get_text(strip=True)
+                elif link_tag.get_text(strip=True):
+                    title = link_tag.get_text(strip=True)
+                
+                if "standvirtual.com" not in link: continue
+
+                # --- B. Image ---
+                image_url = ""
+                img = article.find("img")
+                if img:
+                    image_url = img.get("src") or img.get("data-src") or ""
+
+                # --- C. Price (TARGETED EXTRACTION) ---
+                price = 0
+                
+                # Method 1: Look for specific price attribute
+                price_elem = article.find(attrs={"data-testid": "ad-price"})
+                if price_elem:
+                    price = _to_number(price_elem.get_text(strip=True))
+
+                # Method 2: Find the currency symbol and look at its neighbors
+                if price == 0:
+                    # Find text node with EUR or €
+                    currency = article.find(string=re.compile(r'EUR|€', re.IGNORECASE))
+                    if currency:
+                        # Look at the parent element text (e.g. parent of <small>EUR</small> is <h3>29 900 <small>...)
+                        container_text = currency.parent.parent.get_text(" ", strip=True)
+                        # Regex: Look for numbers immediately before EUR/€
+                        # Allows spaces, dots, commas, hyphens
+                        match = re.search(r'([\d\s\.,-]+)\s*(?:EUR|€)', container_text, re.IGNORECASE)
+                        if match:
+                            price = _to_number(match.group(1))
+                
+                # Method 3: Brute force regex on whole card
+                if price == 0:
+                    card_text = article.get_text(" ", strip=True)
+                    match = re.search(r'([\d\s\.,]+)\s*(?:EUR|€)', card_text, re.IGNORECASE)
+                    if match:
+                        price = _to_number(match.group(1))
+
+                # Sanity Check
+                if price < 500 or price > 10000000:
+                    price = 0
+
+                # --- D. Specs ---
+                specs = _specs_from_text(article.get_text(" ", strip=True).lower())
+
+                # --- VALIDATION ---
+                if price == 0 and specs["year"] == 0: continue
+
+                results.append({
+                    "title": title,
+                    "price": price,
+                    **specs,
+                    "link": link,
+                    "image_url": image_url
+                })
+            except Exception:
+                continue
+
+        return results
+
+
+def _to_number(raw: str) -> int:
+    clean = re.sub(r'[^\d]', '', raw)
+    return int(clean) if clean else 0
+
+
+def _specs_from_text(text_lower: str) -> dict:
+    year_match = re.search(r'\b(19|20)\d{2}\b', text_lower)
+    km_match = re.search(r'(\d[\d\s\.]*)\s?km', text_lower)
+
+    fuel = "Other"
+    if "gasolina" in text_lower: fuel = "Gasolina"
+    elif "diesel" in text_lower: fuel = "Diesel"
+    elif "elétrico" in text_lower: fuel = "Elétrico"
+    elif "híbrido" in text_lower: fuel = "Híbrido"
+
+    return {
+        "year": int(year_match.group(0)) if year_match else 0,
+        "km": _to_number(km_match.group(1)) if km_match else 0,
+        "fuel": fuel,
+    }
+
+
+def default_extractor() -> ContentExtractor:
+    """Extractor used when the scraper is not given one."""
+    return SoupExtractor()
@@ -1,4 +1,10 @@
+from functools import lru_cache
+from types import MappingProxyType
 
+import numpy as np
+
+
+@lru_cache(maxsize=4096)
 def calculate_additional_consumption(avg_person_weight: float, num_people: int):
     """
     Additional fuel consumption per 100 km.
@@ -6,13 +12,37 @@ def calculate_additional_consumption(avg_person_weight: float, num_people: int):
     return (avg_person_weight * num_people * 0.5) / 100
 
 
+@lru_cache(maxsize=4096)
 def calculate_fuel_cost(km_per_month: float, avg_consumption: float, fuel_price: float):
+    """
+    Monthly and yearly fuel usage and cost.
+    The result is cached and therefore read-only; copy it with dict() to modify.
+    """
     liters_used = (km_per_month / 100) * avg_consumption
     monthly_cost = liters_used * fuel_price
     yearly_cost = monthly_cost * 12
     
-    return {
+    return MappingProxyType({
         "liters_used": liters_used,
         "monthly_cost": monthly_cost,
         "yearly_cost": yearly_cost
-    }
+    })
+
+
+def calculate_fuel_cost_batch(km: np.ndarray, cons: np.ndarray, price: np.ndarray) -> np.ndarray:
+    """
+    Vectorized calculate_fuel_cost for many cars at once.
+    Inputs broadcast against each other (e.g. one fuel price for all cars).
+
+    Returns:
+        Record array with fields liters, monthly, yearly
+    """
+    km, cons, price = np.broadcast_arrays(
+        np.asarray(km, dtype=np.float64),
+        np.asarray(cons, dtype=np.float64),
+        np.asarray(price, dtype=np.float64),
+    )
+    liters = (km / 100.0) * cons
+    monthly = liters * price
+    yearly = monthly * 12.0
+    return np.rec.fromarrays([liters, monthly, yearly], names="liters,monthly,yearly")
@@ -1,5 +1,7 @@
+import asyncio
+import logging
+import threading
 import time
-import re
 import os
 from urllib.parse import urlencode
 from selenium import webdriver
@@ -8,7 +10,17 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
-from bs4 import BeautifulSoup
+from tools.content_extractor import ContentExtractor, default_extractor
+
+# --- OPTIONAL ASYNC HTTP (httpx) ---
+try:
+    import httpx
+except ImportError:
+    httpx = None
+# ----------------------------------
+
+log = logging.getLogger(__name__)
+
 
 class StandvirtualScraper:
     """
@@ -16,14 +28,21 @@ class StandvirtualScraper:
     
     PERFORMANCE OPTIMIZATION:
     - Uses 'eager' page loading.
-    - Uses BeautifulSoup for instant data parsing.
+    - Delegates parsing to a ContentExtractor (BeautifulSoup by default).
     - Runs in HEADLESS mode (background).
-    - FIX: Advanced Price Extraction (Traverses up from currency symbol).
+    - search_async() fetches result pages concurrently over plain HTTP and
+      only falls back to the browser when the HTML has no listings.
     """
     BASE_URL = "https://www.standvirtual.com/carros"
+    MAX_CONCURRENT_FETCHES = 10
+    USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
 
-    def __init__(self):
+    def __init__(self, extractor: ContentExtractor = None):
+        self.extractor = extractor or default_extractor()
         self.driver = None
+        # One browser per scraper: concurrent callers (API workers, Streamlit sessions) take turns
+        self._driver_lock = threading.Lock()
+        self._client = None
         self._setup_driver()
 
     def _setup_driver(self):
@@ -32,7 +51,7 @@ class StandvirtualScraper:
                 try: self.driver.quit()
                 except: pass
             
-            print("[Scraper] Initializing Optimized Headless Driver...")
+            log.info("Initializing headless Chrome driver")
             chrome_options = Options()
             
             # --- CONFIGURATION ---
@@ -56,7 +75,7 @@ class StandvirtualScraper:
             chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
             chrome_options.add_experimental_option('useAutomationExtension', False)
             chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-            chrome_options.add_argument("user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36")
+            chrome_options.add_argument(f"user-agent={self.USER_AGENT}")
             chrome_options.add_argument("--lang=pt-PT")
 
             self.driver = webdriver.Chrome(options=chrome_options)
@@ -65,14 +84,13 @@ class StandvirtualScraper:
             self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
                 'source': 'Object.defineProperty(navigator, "webdriver", {get: () => undefined})'
             })
-            print("[Scraper] Driver initialized.")
+            log.info("Driver initialized")
             
         except Exception as e:
-            print(f"[Scraper] Failed to initialize driver: {e}")
+            log.error("Failed to initialize driver: %s", e)
             raise
 
-    def search(self, brand="", model="", min_price=None, max_price=None, min_year=None):
-        # 1. Navigation Logic
+    def _build_url(self, brand="", model="", min_price=None, max_price=None, min_year=None, page=1):
         url = self.BASE_URL
         if brand:
             clean_brand = brand.lower().replace(" ", "-")
@@ -85,15 +103,24 @@ class StandvirtualScraper:
         if min_price: params["search[filter_float_price:from]"] = min_price
         if max_price: params["search[filter_float_price:to]"] = max_price
         if min_year: params["search[filter_float_year:from]"] = min_year
+        if page > 1: params["page"] = page
         
         if params: url += f"?{urlencode(params)}"
-            
-        print(f"[Scraper] Navigating to: {url}")
+        return url
+
+    def search(self, brand="", model="", min_price=None, max_price=None, min_year=None):
+        with self._driver_lock:
+            return self._search_browser(brand, model, min_price, max_price, min_year)
+
+    def _search_browser(self, brand, model, min_price, max_price, min_year):
+        # 1. Navigation Logic
+        url = self._build_url(brand, model, min_price, max_price, min_year)
+        log.debug("Navigating to: %s", url)
         
         try:
             self.driver.get(url)
         except Exception:
-            print("[Scraper] Connection issue, restarting driver...")
+            log.warning("Connection issue, restarting driver")
             self._setup_driver()
             self.driver.get(url)
 
@@ -107,7 +134,7 @@ class StandvirtualScraper:
             pass
 
         # 3. Wait for Content
-        print("[Scraper] Waiting for page content...")
+        log.debug("Waiting for page content")
         try:
             WebDriverWait(self.driver, 10).until(
                 EC.presence_of_element_located((By.TAG_NAME, "article"))
@@ -116,116 +143,80 @@ class StandvirtualScraper:
             if "Nenhum resultado" in self.driver.page_source:
                 return []
 
-        # 4. INSTANT EXTRACTION (BeautifulSoup)
-        print("[Scraper] Parsing HTML...")
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-        
-        results = []
-        articles = soup.find_all("article")
-        
-        print(f"[Scraper] Found {len(articles)} items. Processing...")
+        # 4. INSTANT EXTRACTION
+        log.debug("Parsing HTML")
+        results = self.extractor.parse_results(self.driver.page_source)
+        log.info("Extracted %d valid cars", len(results))
+        return results
+
+    # --- ASYNC FETCHER (httpx) ---
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": self.USER_AGENT, "Accept-Language": "pt-PT,pt;q=0.9"},
+                timeout=15,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.MAX_CONCURRENT_FETCHES),
+            )
+        return self._client
 
-        for article in articles[:40]: 
+    async def _fetch(self, sem, url):
+        async with sem:
             try:
-                # --- A. Link & Title ---
-                link_tag = article.find("a", href=True)
-                if not link_tag: continue
-                
-                link = link_tag['href']
-                
-                # Title strategy
-                title = "No Title"
-                heading = article.find(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-                if heading:
-                    title = heading.get_text(strip=True)
-                elif link_tag.get_text(strip=True):
-                    title = link_tag.get_text(strip=True)
-                
-                if "standvirtual.com" not in link: continue
-
-                # --- B. Image ---
-                image_url = ""
-                img = article.find("img")
-                if img:
-                    image_url = img.get("src") or img.get("data-src") or ""
-
-                # --- C. Price (TARGETED EXTRACTION) ---
-                price = 0
-                
-                # Method 1: Look for specific price attribute
-                price_elem = article.find(attrs={"data-testid": "ad-price"})
-                if price_elem:
-                    raw = price_elem.get_text(strip=True)
-                    clean = re.sub(r'[^\d]', '', raw)
-                    if clean: price = int(clean)
-
-                # Method 2: Find the currency symbol and look at its neighbors
-                if price == 0:
-                    # Find text node with EUR or €
-                    currency = article.find(string=re.compile(r'EUR|€', re.IGNORECASE))
-                    if currency:
-                        # Look at the parent element text (e.g. parent of <small>EUR</small> is <h3>29 900 <small>...)
-                        container_text = currency.parent.parent.get_text(" ", strip=True)
-                        # Regex: Look for numbers immediately before EUR/€
-                        # Allows spaces, dots, commas, hyphens
-                        match = re.search(r'([\d\s\.,-]+)\s*(?:EUR|€)', container_text, re.IGNORECASE)
-                        if match:
-                            clean = re.sub(r'[^\d]', '', match.group(1))
-                            if clean: price = int(clean)
-                
-                # Method 3: Brute force regex on whole card
-                if price == 0:
-                    card_text = article.get_text(" ", strip=True)
-                    match = re.search(r'([\d\s\.,]+)\s*(?:EUR|€)', card_text, re.IGNORECASE)
-                    if match:
-                         clean = re.sub(r'[^\d]', '', match.group(1))
-                         if clean: price = int(clean)
-
-                # Sanity Check
-                if price < 500 or price > 10000000:
-                    price = 0
-
-                # --- D. Specs ---
-                text_content = article.get_text(" ", strip=True)
-                text_lower = text_content.lower()
-                
-                year = 0
-                year_match = re.search(r'\b(19|20)\d{2}\b', text_lower)
-                if year_match: year = int(year_match.group(0))
-
-                km = 0
-                km_match = re.search(r'(\d[\d\s\.]*)\s?km', text_lower)
-                if km_match: 
-                    clean_km = re.sub(r'[^\d]', '', km_match.group(1))
-                    if clean_km: km = int(clean_km)
-
-                fuel = "Other"
-                if "gasolina" in text_lower: fuel = "Gasolina"
-                elif "diesel" in text_lower: fuel = "Diesel"
-                elif "elétrico" in text_lower: fuel = "Elétrico"
-                elif "híbrido" in text_lower: fuel = "Híbrido"
-
-                # --- VALIDATION ---
-                if price == 0 and year == 0: continue
-
-                results.append({
-                    "title": title,
-                    "price": price,
-                    "year": year,
-                    "km": km,
-                    "fuel": fuel,
-                    "link": link,
-                    "image_url": image_url
-                })
-            except Exception:
-                continue
-
-        print(f"[Scraper] Done. Extracted {len(results)} valid cars.")
+                response = await self._get_client().get(url)
+                if response.status_code != 200:
+                    log.warning("HTTP %s for %s", response.status_code, url)
+                    return ""
+                return response.text
+            except httpx.HTTPError as e:
+                log.warning("Fetch failed for %s: %s", url, e)
+                return ""
+
+    async def search_async(self, brand="", model="", min_price=None, max_price=None, min_year=None, pages=3):
+        """
+        Fetches the first `pages` result pages concurrently (bounded by a
+        semaphore) and parses them without a browser. Falls back to the
+        Selenium search() when the server-rendered HTML has no listings.
+        """
+        if httpx is None:
+            return await asyncio.to_thread(self.search, brand, model, min_price, max_price, min_year)
+
+        urls = [self._build_url(brand, model, min_price, max_price, min_year, page) for page in range(1, pages + 1)]
+        log.debug("Fetching %d pages concurrently from: %s", len(urls), urls[0])
+
+        sem = asyncio.Semaphore(self.MAX_CONCURRENT_FETCHES)
+        pages_html = await asyncio.gather(*(self._fetch(sem, url) for url in urls))
+
+        # Parsing is CPU-bound, so keep it off the event loop
+        parsed = await asyncio.to_thread(lambda: [self.extractor.parse_results(html) if html else [] for html in pages_html])
+
+        if not parsed[0]:
+            if "Nenhum resultado" in pages_html[0]:
+                return []
+            log.info("No listings in the static HTML, falling back to the browser")
+            return await asyncio.to_thread(self.search, brand, model, min_price, max_price, min_year)
+
+        results, seen = [], set()
+        for page_results in parsed:
+            for car in page_results:
+                if car["link"] not in seen:
+                    seen.add(car["link"])
+                    results.append(car)
+
+        log.info("Extracted %d valid cars from %d pages", len(results), len(urls))
         return results
 
-    def __del__(self):
-        try:
-            if hasattr(self, 'driver') and self.driver:
+    async def aclose(self):
+        """Closes the HTTP client used by search_async()."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def close(self):
+        """Quits the Chrome driver and releases the browser process."""
+        if self.driver:
+            try:
                 self.driver.quit()
-        except:
-            pass
\ No newline at end of file
+            finally:
+                self.driver = None
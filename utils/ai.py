@@ -1,8 +1,23 @@
 import os
 import json
+import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from dotenv import load_dotenv
+from utils import llm_cache
+
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    _loads = json.loads
+
+log = logging.getLogger(__name__)
 
 # Load .env from project root
 BASE_DIR = Path(__file__).parent.parent.resolve()
@@ -11,16 +26,49 @@ load_dotenv(env_path)
 
 API_KEY = os.getenv("GOOGLE_API_KEY")
 MODEL = "gemini-2.0-flash-exp"  # stabilny model REST
+MODEL_EXTRACT = "gemini-2.5-flash-lite"  # small model for deterministic JSON extraction (single source of truth)
 BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models/"
 URL = f"{BASE_URL}{MODEL}:generateContent"
+_MODEL_URLS = {m: f"{BASE_URL}{m}:generateContent" for m in (MODEL, MODEL_EXTRACT)}
+
+# Built once: the key travels in a header, so every endpoint stays a constant URL
+_HEADERS = {"Content-Type": "application/json", "x-goog-api-key": API_KEY or ""}
 
-print("[utils.ai] Gemini API KEY loaded:", "YES" if API_KEY else "NO")
+log.info("Gemini API key loaded: %s", "YES" if API_KEY else "NO")
 
+# One pooled keep-alive session for every call_gemini request.
+# Transient 5xx / connection errors are retried; 429 quota errors are not,
+# since Gemini asks for a long retry delay there.
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    ),
+))
+_http.headers.update(_HEADERS)
 
-def call_gemini(prompt: str, system_instruction: str = None) -> str:
+
+def call_gemini(prompt: str, system_instruction: str = None, cache: bool = False) -> str:
+    """
+    Generates free text with Gemini.
+    Responses are sampled at temperature 0.7, so they are only cached when
+    the caller opts in with cache=True.
+    """
     if not API_KEY:
         return "Gemini API error: missing API key."
 
+    cache_key = llm_cache.make_key(MODEL, system_instruction, prompt, None, 0.7) if cache else None
+    if cache_key:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     payload = {
         "contents": [{"parts": [{"text": prompt}]}],
         "generationConfig": {"temperature": 0.7}
@@ -29,19 +77,13 @@ def call_gemini(prompt: str, system_instruction: str = None) -> str:
     if system_instruction:
         payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
 
-    headers = {"Content-Type": "application/json"}
-
     try:
-        resp = requests.post(
-            f"{URL}?key={API_KEY}",
-            headers=headers,
-            data=json.dumps(payload)
-        )
+        resp = _http.post(URL, data=_dumps(payload), timeout=60)
 
         if resp.status_code != 200:
             return f"Gemini API error ({resp.status_code}): {resp.text}"
 
-        data = resp.json()
+        data = _loads(resp.content)
 
         text = (
             data.get("candidates", [{}])[0]
@@ -50,7 +92,63 @@ def call_gemini(prompt: str, system_instruction: str = None) -> str:
                 .get("text", "")
         )
 
+        if text and cache_key:
+            llm_cache.put(cache_key, text)
         return text or "Gemini returned an empty response."
 
     except Exception as e:
         return f"Gemini API error: {e}"
+
+
+def call_gemini_structured(prompt: str, response_schema: dict, system_instruction: str = None,
+                           temperature: float = 0.0, bypass_cache: bool = False, model: str = MODEL) -> dict:
+    """
+    Generates JSON with Gemini's structured output (responseMimeType + responseSchema).
+    Deterministic (temperature 0) answers are cached.
+    Pass model=MODEL_EXTRACT to route simple extraction to the smaller model.
+
+    Raises:
+        EnvironmentError: if the API key is missing
+        requests.HTTPError: on a non-200 response
+        ValueError: if the model output is not valid JSON
+    """
+    if not API_KEY:
+        raise EnvironmentError("Gemini API error: missing API key.")
+
+    use_cache = temperature == 0 and not bypass_cache
+    cache_key = llm_cache.make_key(model, system_instruction, prompt, response_schema, temperature)
+    if use_cache:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "responseMimeType": "application/json",
+            "responseSchema": response_schema,
+            "temperature": temperature
+        }
+    }
+
+    if system_instruction:
+        payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+
+    url = _MODEL_URLS.get(model) or f"{BASE_URL}{model}:generateContent"
+    resp = _http.post(url, data=_dumps(payload), timeout=60)
+    if resp.status_code != 200:
+        log.error("Gemini API error (%s): %.200s", resp.status_code, resp.text)
+        resp.raise_for_status()
+
+    text = (
+        _loads(resp.content).get("candidates", [{}])[0]
+            .get("content", {})
+            .get("parts", [{}])[0]
+            .get("text", "{}")
+    )
+    data = _loads(text)
+
+    if use_cache:
+        llm_cache.put(cache_key, data)
+    return data
+
@@ -0,0 +1,114 @@
+"""
+LLM response cache.
+In-process LRU in front of an optional on-disk store (diskcache), keyed by a
+hash of everything that determines the model's answer. Entries expire after
+a TTL, and empty answers (blocked or truncated responses) are never stored.
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = Path(__file__).parent.parent.resolve() / ".llm_cache"
+MEMORY_SIZE = 256
+DEFAULT_TTL = 24 * 3600
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+_disk = None
+
+
+def _get_disk():
+    global _disk
+    if _disk is None and diskcache is not None:
+        try:
+            _disk = diskcache.Cache(str(CACHE_DIR))
+        except Exception as e:
+            log.warning("Disk cache unavailable, using memory only: %s", e)
+    return _disk
+
+
+def make_key(model: str, system_instruction: str, prompt: str, response_schema=None, temperature: float = 0.0) -> str:
+    """
+    Build a cache key for one LLM request.
+
+    Args:
+        model: Model name
+        system_instruction: System prompt (may be None)
+        prompt: User prompt
+        response_schema: Structured-output schema (may be None)
+        temperature: Sampling temperature
+
+    Returns:
+        Hex digest identifying the request
+    """
+    schema_json = json.dumps(response_schema, sort_keys=True) if response_schema is not None else ""
+    raw = f"{model}|{system_instruction or ''}|{prompt}|{schema_json}|{temperature}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=20).hexdigest()
+
+
+def get(key: str):
+    """
+    Look up a cached response.
+
+    Returns:
+        A private copy of the cached value, or None on a miss
+    """
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.time():
+                _memory.move_to_end(key)
+                return copy.deepcopy(value)
+            del _memory[key]
+
+    disk = _get_disk()
+    if disk is None:
+        return None
+    try:
+        # With expire_time=True diskcache returns (value, expire_time), and (default, None) on a miss
+        value, expires_at = disk.get(key, default=None, expire_time=True)
+    except Exception:
+        return None
+    if value is None:
+        return None
+    _remember(key, value, expires_at or time.time() + DEFAULT_TTL)
+    return copy.deepcopy(value)
+
+
+def put(key: str, value, ttl: int = DEFAULT_TTL) -> None:
+    """
+    Store a response in memory and, when available, on disk.
+    None and empty values ({} from a response without candidates) are skipped,
+    so a transient failure is not replayed.
+    """
+    if value is None or (isinstance(value, (dict, list, str)) and not value):
+        return
+    _remember(key, copy.deepcopy(value), time.time() + ttl)
+
+    disk = _get_disk()
+    if disk is not None:
+        try:
+            disk.set(key, value, expire=ttl)
+        except Exception as e:
+            log.warning("Failed to write to disk cache: %s", e)
+
+
+def _remember(key: str, value, expires_at: float) -> None:
+    with _lock:
+        _memory[key] = (value, expires_at)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_SIZE:
+            _memory.popitem(last=False)
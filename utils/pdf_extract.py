@@ -0,0 +1,215 @@
+"""
+PDF text extraction utilities.
+Picks the fastest available backend: pypdfium2, then PyMuPDF, then pypdf.
+"""
+import io
+import logging
+import re
+from typing import Tuple
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+log = logging.getLogger(__name__)
+
+# Content streams above this size are almost always vector drawings; only their
+# text-showing operators are scanned instead of running full layout extraction.
+MAX_CONTENT_STREAM_BYTES = 512_000
+
+_RE_STRING_START = re.compile(rb"[(<\[]")
+_RE_LITERAL_STEP = re.compile(rb"[\\()]")
+_RE_ARRAY_STEP = re.compile(rb"[(<\]]")
+_RE_HEX_STRING = re.compile(rb"<([0-9A-Fa-f\s]*)>")
+_RE_SHOW_OP = re.compile(rb"\s*T[jJ]")
+_RE_ESCAPE = re.compile(rb"\\([0-7]{1,3}|\r\n|[\s\S])")
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f",
+            b"\n": b"", b"\r": b"", b"\r\n": b""}  # backslash + EOL is a line continuation
+
+
+def _extract_pdfium(data: bytes) -> Tuple[str, int]:
+    pdf = pypdfium2.PdfDocument(io.BytesIO(data))
+    try:
+        texts = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+        return "\n".join(texts), len(pdf)
+    finally:
+        pdf.close()
+
+
+def _extract_fitz(data: bytes) -> Tuple[str, int]:
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        text = "\n".join(page.get_text("text") for page in doc)
+        return text, doc.page_count
+    finally:
+        doc.close()
+
+
+def _unescape(match) -> bytes:
+    code = match.group(1)
+    if code[0] in b"01234567":
+        return bytes([int(code, 8) & 0xFF])
+    return _ESCAPES.get(code, code)
+
+
+def _decode_literal(body: bytes) -> str:
+    return _RE_ESCAPE.sub(_unescape, body).decode("latin-1")
+
+
+def _decode_hex(hex_digits: bytes) -> str:
+    digits = re.sub(rb"\s", b"", hex_digits)
+    if len(digits) % 2:
+        digits += b"0"
+    return bytes.fromhex(digits.decode("ascii")).decode("latin-1")
+
+
+def _read_literal(raw: bytes, start: int):
+    """
+    Reads the literal string opening at raw[start] == "(". Balanced unescaped
+    parentheses are part of the string, as the PDF spec allows.
+
+    Returns:
+        Tuple of (body, end), or (None, len(raw)) if the string is unterminated
+    """
+    depth = 0
+    pos = start
+    while True:
+        match = _RE_LITERAL_STEP.search(raw, pos)
+        if match is None:
+            return None, len(raw)
+        char = match.group(0)
+        pos = match.end()
+        if char == b"\\":
+            pos += 1
+        elif char == b"(":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return raw[start + 1:pos - 1], pos
+
+
+def _read_string(raw: bytes, start: int):
+    """Returns (decoded text, end) for the literal or hex string at start, or (None, end) if there is none."""
+    if raw[start:start + 1] == b"(":
+        body, end = _read_literal(raw, start)
+        return (None if body is None else _decode_literal(body)), end
+    match = _RE_HEX_STRING.match(raw, start)
+    if match is None:
+        return None, start + 1  # "<<" dictionary, not a string
+    return _decode_hex(match.group(1)), match.end()
+
+
+def _read_array(raw: bytes, start: int):
+    """Returns (joined strings, end) for the TJ-style array opening at raw[start] == "["."""
+    pieces = []
+    pos = start + 1
+    while True:
+        match = _RE_ARRAY_STEP.search(raw, pos)
+        if match is None:
+            return None, len(raw)
+        if match.group(0) == b"]":
+            return "".join(pieces), match.end()
+        text, pos = _read_string(raw, match.start())
+        if text is not None:
+            pieces.append(text)
+        elif pos >= len(raw):
+            return None, pos
+
+
+def _text_only_scan(raw: bytes) -> str:
+    """
+    Pull the strings out of Tj/TJ operators, skipping all drawing ops.
+    Pieces of one TJ array are joined without spaces (the numbers between
+    them are kerning). Strings are read with a small scanner, so balanced
+    parentheses and "]" inside them are kept. Less accurate than layout
+    extraction, but linear in the stream size.
+    """
+    chunks = []
+    pos = 0
+    size = len(raw)
+    while pos < size:
+        match = _RE_STRING_START.search(raw, pos)
+        if match is None:
+            break
+        start = match.start()
+        if match.group(0) == b"[":
+            text, pos = _read_array(raw, start)
+        else:
+            text, pos = _read_string(raw, start)
+        if text is not None and _RE_SHOW_OP.match(raw, pos):
+            chunks.append(text)
+    return " ".join(chunks)
+
+
+def _extract_pypdf_page(page) -> str:
+    try:
+        contents = page.get_contents()
+        raw = contents.get_data() if contents is not None else b""
+    except Exception:
+        raw = b""
+
+    if len(raw) > MAX_CONTENT_STREAM_BYTES:
+        return _text_only_scan(raw)
+    return page.extract_text() or ""
+
+
+def _extract_pypdf(data: bytes) -> Tuple[str, int]:
+    import pypdf
+
+    pdf_reader = pypdf.PdfReader(io.BytesIO(data))
+    text = "\n".join(_extract_pypdf_page(page) for page in pdf_reader.pages)
+    return text, len(pdf_reader.pages)
+
+
+def extract_with_pages(data: bytes) -> Tuple[str, int]:
+    """
+    Extract the text of a PDF together with its page count.
+
+    Args:
+        data: Raw PDF file bytes
+
+    Returns:
+        Tuple of (text, number of pages)
+    """
+    if pypdfium2 is not None:
+        try:
+            return _extract_pdfium(data)
+        except Exception as e:
+            log.warning("pypdfium2 failed, falling back: %s", e)
+
+    if fitz is not None:
+        try:
+            return _extract_fitz(data)
+        except Exception as e:
+            log.warning("PyMuPDF failed, falling back: %s", e)
+
+    return _extract_pypdf(data)
+
+
+def extract(data: bytes) -> str:
+    """
+    Extract the text of a PDF.
+
+    Args:
+        data: Raw PDF file bytes
+
+    Returns:
+        Extracted text, one page per block
+
+    Example:
+        >>> text = extract(uploaded_file.read())
+    """
+    text, _ = extract_with_pages(data)
+    return text
@@ -3,9 +3,19 @@ Prompt management utilities.
 Load and format prompts from text files.
 """
 import os
+from functools import lru_cache
 from pathlib import Path
 
 
+@lru_cache(maxsize=32)
+def _read_prompt(prompt_path: Path) -> str:
+    if not prompt_path.exists():
+        raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
+
+    with open(prompt_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
 class PromptLoader:
     """Load and manage prompt templates from files."""
 
@@ -39,12 +49,7 @@ class PromptLoader:
             >>> prompt = loader.load("classify_ticket")
         """
         prompt_path = self.prompts_dir / f"{prompt_name}.txt"
-
-        if not prompt_path.exists():
-            raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
-
-        with open(prompt_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return _read_prompt(prompt_path)
 
     def format(self, prompt_name: str, **kwargs) -> str:
         """
@@ -0,0 +1,135 @@
+"""
+Semantic (embedding-similarity) cache.
+Returns a stored answer when a new input is a near-duplicate of an earlier
+one, e.g. "bmw 320d under 10k" vs "BMW 320d até 10k€".
+
+Requires sentence-transformers; without it every lookup is a miss.
+FAISS is used for the nearest-neighbour search when installed, otherwise
+a NumPy dot product over the (small) cache.
+"""
+import logging
+import threading
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    np = None
+    SentenceTransformer = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def _get_encoder(model_name: str):
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = SentenceTransformer(model_name)
+        return _encoder
+
+
+class SemanticCache:
+    """Nearest-neighbour cache over normalised sentence embeddings."""
+
+    def __init__(self, threshold: float = 0.95, model_name: str = DEFAULT_MODEL, max_entries: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            model_name: sentence-transformers model used for embeddings
+            max_entries: Entries kept per namespace (oldest are dropped)
+        """
+        self.threshold = threshold
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.enabled = SentenceTransformer is not None
+        self._spaces = {}
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str):
+        vector = _get_encoder(self.model_name).encode([text], normalize_embeddings=True)
+        return np.asarray(vector, dtype="float32")
+
+    def lookup(self, text: str, namespace=None):
+        """
+        Find the value stored for the most similar earlier input.
+
+        Args:
+            text: Input to match
+            namespace: Only entries added under the same namespace are compared
+                       (use it for fields that must match exactly, like numbers)
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        try:
+            query = self._embed(text)
+        except Exception as e:
+            log.warning("Embedding failed, cache disabled: %s", e)
+            self.enabled = False
+            return None
+
+        with self._lock:
+            space = self._spaces.get(namespace)
+            if not space or not space["values"]:
+                return None
+
+            if faiss is not None:
+                scores, ids = space["index"].search(query, 1)
+                best_score, best_id = float(scores[0][0]), int(ids[0][0])
+            else:
+                sims = space["vectors"] @ query[0]
+                best_id = int(np.argmax(sims))
+                best_score = float(sims[best_id])
+
+            if best_score >= self.threshold:
+                return space["values"][best_id]
+        return None
+
+    def add(self, text: str, value, namespace=None) -> None:
+        """
+        Store a value for an input.
+
+        Args:
+            text: Input that produced the value
+            value: Value to return for similar inputs
+            namespace: See lookup()
+        """
+        if not self.enabled or value is None:
+            return
+        try:
+            vector = self._embed(text)
+        except Exception as e:
+            log.warning("Embedding failed, cache disabled: %s", e)
+            self.enabled = False
+            return
+
+        with self._lock:
+            space = self._spaces.get(namespace)
+            if space is None:
+                space = {"vectors": np.empty((0, vector.shape[1]), dtype="float32"), "values": [], "index": None}
+                self._spaces[namespace] = space
+
+            full = len(space["values"]) >= self.max_entries
+            space["vectors"] = np.vstack([space["vectors"], vector])[-self.max_entries:]
+            space["values"] = (space["values"] + [value])[-self.max_entries:]
+
+            if faiss is not None:
+                if space["index"] is None or full:
+                    space["index"] = faiss.IndexFlatIP(space["vectors"].shape[1])
+                    space["index"].add(space["vectors"])
+                else:
+                    space["index"].add(vector)
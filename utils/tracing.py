@@ -1,5 +1,23 @@
+import atexit
+import logging
 import os
 
+# --- SAFE IMPORT FOR LANGFUSE (v3 client singleton, or the v2 decorator context) ---
+try:
+    from langfuse import Langfuse, get_client
+except ImportError:
+    Langfuse = get_client = None
+try:
+    from langfuse.decorators import langfuse_context
+except ImportError:
+    langfuse_context = None
+# --------------------------------
+
+log = logging.getLogger(__name__)
+
+_client = None
+
+
 def init_tracing():
     """
     Checks if Langfuse credentials exist in the environment.
@@ -7,11 +25,42 @@ def init_tracing():
     - LANGFUSE_SECRET_KEY
     - LANGFUSE_PUBLIC_KEY
     - LANGFUSE_HOST
+
+    Configures the client the @observe decorators report through once per
+    process, to batch events in the background; pending events are flushed
+    by the shutdown hook.
     """
+    global _client
+    if _client is not None:
+        return _client
+
     secret_key = os.getenv("LANGFUSE_SECRET_KEY")
     public_key = os.getenv("LANGFUSE_PUBLIC_KEY")
-    
-    if secret_key and public_key:
-        print("[Tracing] Langfuse credentials found. Tracing enabled.")
+
+    if not (secret_key and public_key):
+        log.info("Langfuse credentials missing. Tracing will be inactive.")
+        return None
+
+    if get_client is not None:
+        # v3: the first client constructed becomes the singleton behind @observe
+        _client = Langfuse(flush_at=20, flush_interval=5)
+    elif langfuse_context is not None:
+        langfuse_context.configure(flush_at=20, flush_interval=5)
+        _client = langfuse_context
     else:
-        print("[Tracing] Langfuse credentials missing. Tracing will be inactive.")
\ No newline at end of file
+        log.warning("Langfuse credentials found, but the langfuse package is unavailable. Tracing disabled.")
+        return None
+
+    atexit.register(_client.flush)
+    log.info("Langfuse credentials found. Tracing enabled.")
+    return _client
+
+
+def flush_tracing():
+    """
+    Synchronously flushes pending trace events.
+    Only active when LANGFUSE_SYNC is set, for debugging; otherwise the
+    SDK's background batching handles delivery.
+    """
+    if _client is not None and os.getenv("LANGFUSE_SYNC"):
+        _client.flush()